@@ -2,22 +2,162 @@
 FleetClient - Auto-enrolling fleet agent.
 """
 
-import json
+import asyncio
+import functools
+import hashlib
+import heapq
+import itertools
 import logging
 import platform
+import queue
+import random
 import socket
 import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import grpc
+from google.protobuf.internal import api_implementation
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 from fleetspeak.src.common.proto.fleetspeak import common_pb2
-from fleetspeak.src.server.grpcservice.proto.fleetspeak_grpcservice import grpcservice_pb2_grpc
+from fleetspeak.src.server.grpcservice.proto.fleetspeak_grpcservice import grpcservice_pb2, grpcservice_pb2_grpc
+
+from pyfleet.common import json_dumps
 
 logger = logging.getLogger(__name__)
 
+# Max messages packed into one "batch" RPC by flush()
+MAX_BATCH_SIZE = 64
+
+# Threads running scheduled heartbeats, reconnects and buffered flushes; each can be
+# held for a whole RPC timeout by an unreachable server
+SCHEDULER_WORKERS = 16
+
+# Keepalive stops NATs from reaping idle connections between heartbeats;
+# a local subchannel pool keeps pooled channels on separate connections.
+CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_time_between_pings_ms", 30000),
+    ("grpc.max_send_message_length", 64 * 1024 * 1024),
+    ("grpc.max_receive_message_length", 64 * 1024 * 1024),
+    ("grpc.enable_retries", 1),
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+# Full method path of Processor.Process, for calls with pre-serialized requests
+_PROCESS_METHOD = "/%s/Process" % grpcservice_pb2.DESCRIPTOR.services_by_name["Processor"].full_name
+
+
+@functools.lru_cache(maxsize=None)
+def _local_ip() -> str:
+    """Get this host's outbound IP (probed once per process)."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        return "unknown"
+
+
+class _HeartbeatScheduler:
+    """
+    One daemon thread that keeps time for every FleetClient in the process,
+    instead of a sleeping thread per client. Due actions run on a shared
+    worker pool, so a client blocked on a slow server doesn't delay the rest.
+    """
+    
+    def __init__(self):
+        self._queue: List[Tuple[float, int, Callable[[], None]]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._workers: Optional[ThreadPoolExecutor] = None
+    
+    def enter(self, delay: float, action: Callable[[], None]) -> None:
+        """Run action after delay seconds."""
+        with self._cond:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._seq), action))
+            if self._thread is None:
+                self._workers = ThreadPoolExecutor(SCHEDULER_WORKERS, thread_name_prefix="pyfleet-heartbeat-worker")
+                self._thread = threading.Thread(target=self._run, name="pyfleet-heartbeat", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+    
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._cond.wait(timeout)
+                _, _, action = heapq.heappop(self._queue)
+            self._workers.submit(self._call, action)
+    
+    @staticmethod
+    def _call(action: Callable[[], None]) -> None:
+        try:
+            action()
+        except Exception:
+            logger.exception("Heartbeat task failed")
+
+
+_scheduler = _HeartbeatScheduler()
+
+
+class _ChannelPool:
+    """
+    Round-robin pool of independent gRPC channels.
+    
+    Each channel gets distinct channel args so gRPC doesn't collapse them
+    onto one shared subchannel (and one HTTP/2 connection).
+    """
+    
+    def __init__(self, address: str, size: int = 4, factory: Callable = grpc.insecure_channel):
+        self.channels: List[grpc.Channel] = [
+            factory(address, options=CHANNEL_OPTIONS + [("grpc.channel_id", i)])
+            for i in range(max(1, size))
+        ]
+        self.stubs: List[grpcservice_pb2_grpc.ProcessorStub] = [
+            grpcservice_pb2_grpc.ProcessorStub(ch) for ch in self.channels
+        ]
+        # Same RPC as stub.Process, but the request is already-serialized bytes
+        self.raw_process: List[Callable] = [
+            ch.unary_unary(_PROCESS_METHOD, response_deserializer=common_pb2.EmptyMessage.FromString)
+            for ch in self.channels
+        ]
+        self._counter = 0
+        self._lock = threading.Lock()
+    
+    def _next_index(self) -> int:
+        with self._lock:
+            self._counter = (self._counter + 1) % len(self.channels)
+            return self._counter
+    
+    def next_stub(self) -> grpcservice_pb2_grpc.ProcessorStub:
+        """Get the next stub in round-robin order."""
+        return self.stubs[self._next_index()]
+    
+    def next_raw_process(self) -> Callable:
+        """Get the next raw-bytes Process callable in round-robin order."""
+        return self.raw_process[self._next_index()]
+    
+    def wait_ready(self, timeout: float) -> None:
+        for ch in self.channels:
+            grpc.channel_ready_future(ch).result(timeout=timeout)
+    
+    def close(self) -> None:
+        for ch in self.channels:
+            ch.close()
+
 
 class FleetClient:
     """
@@ -33,6 +173,10 @@ class FleetClient:
         client.start()
         client.send_json("status", {"cpu": 45})
         client.wait()
+    
+    Or from a running event loop, using grpc.aio:
+        await client.start_async()
+        await client.send_json_async("status", {"cpu": 45})
     """
     
     def __init__(
@@ -42,21 +186,56 @@ class FleetClient:
         agent_version: str = "1.0.0",
         heartbeat_interval: float = 15.0,  # 15s heartbeat
         tags: Optional[List[str]] = None,
+        pool_size: int = 4,
+        buffer_delay: float = 5.0,  # Max time send_buffered() holds a message
     ):
         self.server_address = server_address
-        self.client_id = client_id or self._generate_id()
+        self._hostname = socket.gethostname()
+        if client_id:
+            self.client_id = client_id
+            self._client_id_bytes = client_id.encode()
+        else:
+            # 8-byte Fleetspeak-style id; the hex form is what the server reports
+            self._client_id_bytes = self._generate_id()
+            self.client_id = self._client_id_bytes.hex()
         self.agent_version = agent_version
         self.heartbeat_interval = heartbeat_interval
         self.tags = tags or []
+        self.pool_size = pool_size
+        self.buffer_delay = buffer_delay
+        self._cached_system_info = self._system_info()
+        
+        if api_implementation.Type() == "python":
+            logger.warning(
+                "protobuf is using the pure-Python backend; install protobuf>=4 "
+                "for the much faster upb/C++ backend"
+            )
         
-        self._channel: Optional[grpc.Channel] = None
-        self._stub = None
+        # Pre-built protobuf addresses, reused for every outbound message
+        self._src_addr = common_pb2.Address(client_id=self._client_id_bytes)
+        self._dst_addr = common_pb2.Address(service_name="pyfleet")
+        # Heartbeats never change, so the request is serialized once and
+        # sent as raw bytes; blocking sends reuse a per-thread message
+        # (see _send_message)
+        self._hb_bytes = self._heartbeat_message().SerializeToString()
+        self._send_local = threading.local()
+        
+        self._pool: Optional[_ChannelPool] = None
         self._connected = False
         self._enrolled = False
         self._running = False
         
-        self._heartbeat_thread: Optional[threading.Thread] = None
         self._stop = threading.Event()
+        self._generation = 0  # Bumped on start() so stale scheduled ticks exit
+        self._reconnect_delay = 5
+        
+        self._send_queue: "queue.SimpleQueue[common_pb2.Message]" = queue.SimpleQueue()
+        self._flush_scheduled = False
+        self._flush_lock = threading.Lock()
+        
+        self._aio_pool: Optional[_ChannelPool] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._async_stop: Optional[asyncio.Event] = None
         
         self._command_handlers: List[Callable] = []
         
@@ -66,30 +245,55 @@ class FleetClient:
             "heartbeats": 0,
         }
     
-    def _generate_id(self) -> str:
-        hostname = socket.gethostname()
+    def _generate_id(self) -> bytes:
         mac = uuid.getnode()
-        return f"{hostname}-{mac}"[:32]
+        return hashlib.blake2b(f"{self._hostname}-{mac}".encode(), digest_size=8).digest()
     
     def _system_info(self) -> Dict[str, Any]:
-        # Get container's own IP
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-        except:
-            ip = "unknown"
-        
         return {
-            "hostname": socket.gethostname(),
+            "hostname": self._hostname,
             "os_type": platform.system(),
             "os_version": platform.version(),
             "agent_version": self.agent_version,
-            "ip_address": ip,
+            "ip_address": _local_ip(),
             "tags": self.tags,
         }
     
+    def refresh_system_info(self) -> Dict[str, Any]:
+        """Re-probe hostname/IP and rebuild the info sent on enrollment."""
+        _local_ip.cache_clear()
+        self._hostname = socket.gethostname()
+        self._cached_system_info = self._system_info()
+        return self._cached_system_info
+    
+    def _message(self, message_type: str, data: bytes = b"", encoding: str = "") -> common_pb2.Message:
+        msg = common_pb2.Message(
+            message_type=message_type,
+            destination=self._dst_addr,
+            source=self._src_addr,
+        )
+        msg.data.value = data
+        if encoding:
+            msg.annotations.entries.add(key="encoding", value=encoding)
+        return msg
+    
+    def _send_message(self, message_type: str, data: bytes, encoding: str) -> common_pb2.Message:
+        msg = getattr(self._send_local, "msg", None)
+        if msg is None:
+            msg = self._send_local.msg = self._message(message_type)
+        msg.message_type = message_type
+        msg.data.value = data
+        del msg.annotations.entries[:]
+        if encoding:
+            msg.annotations.entries.add(key="encoding", value=encoding)
+        return msg
+    
+    def _heartbeat_message(self) -> common_pb2.Message:
+        return common_pb2.Message(
+            message_type="heartbeat",
+            source=self._src_addr,
+        )
+    
     def on_command(self, handler: Callable) -> Callable:
         """Decorator for command handlers."""
         self._command_handlers.append(handler)
@@ -98,21 +302,23 @@ class FleetClient:
     def connect(self) -> bool:
         """Connect to server."""
         try:
-            self._channel = grpc.insecure_channel(self.server_address)
-            self._stub = grpcservice_pb2_grpc.ProcessorStub(self._channel)
-            grpc.channel_ready_future(self._channel).result(timeout=10)
+            if self._pool:
+                self._pool.close()
+            self._pool = _ChannelPool(self.server_address, self.pool_size)
+            self._pool.wait_ready(timeout=10)
             self._connected = True
-            logger.info(f"Connected to {self.server_address}")
+            logger.info("Connected to %s", self.server_address)
             return True
         except Exception as e:
-            logger.error(f"Connection failed: {e}")
+            logger.error("Connection failed: %s", e)
             self._connected = False
             return False
     
     def disconnect(self) -> None:
         """Disconnect from server."""
-        if self._channel:
-            self._channel.close()
+        if self._pool:
+            self._pool.close()
+            self._pool = None
         self._connected = False
         self._enrolled = False
     
@@ -122,73 +328,117 @@ class FleetClient:
             return False
         
         try:
-            msg = common_pb2.Message(
-                message_type="enrollment",
-                destination=common_pb2.Address(service_name="pyfleet"),
-                source=common_pb2.Address(client_id=self.client_id.encode()),
-            )
-            msg.data.value = json.dumps(self._system_info()).encode()
-            
-            self._stub.Process(msg, timeout=30)
+            msg = self._message("enrollment", json_dumps(self._cached_system_info))
+            self._pool.next_stub().Process(msg, timeout=30)
             self._enrolled = True
-            logger.info(f"Enrolled as {self.client_id}")
+            logger.info("Enrolled as %s", self.client_id)
             return True
         except Exception as e:
-            logger.error(f"Enrollment failed: {e}")
+            logger.error("Enrollment failed: %s", e)
             return False
     
-    def send(self, message_type: str, data: bytes = b"") -> bool:
+    def send(self, message_type: str, data: bytes = b"", encoding: str = "") -> bool:
         """Send message to server."""
         if not self._connected:
             return False
         
         try:
-            msg = common_pb2.Message(
-                message_type=message_type,
-                destination=common_pb2.Address(service_name="pyfleet"),
-                source=common_pb2.Address(client_id=self.client_id.encode()),
-            )
-            msg.data.value = data
-            
-            self._stub.Process(msg, timeout=30)
+            # Safe to reuse: the blocking call serializes before returning
+            msg = self._send_message(message_type, data, encoding)
+            self._pool.next_stub().Process(msg, timeout=30)
             self._stats["sent"] += 1
             return True
         except Exception as e:
-            logger.error(f"Send failed: {e}")
+            logger.error("Send failed: %s", e)
             self._stats["failed"] += 1
             self._connected = False
             return False
     
     def send_json(self, message_type: str, data: Dict[str, Any]) -> bool:
         """Send JSON data."""
-        return self.send(message_type, json.dumps(data).encode())
+        return self.send(message_type, json_dumps(data))
+    
+    def send_msgpack(self, message_type: str, data: Dict[str, Any]) -> bool:
+        """Send msgpack data, annotated with encoding=msgpack."""
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed")
+        return self.send(message_type, msgpack.packb(data, use_bin_type=True), encoding="msgpack")
+    
+    def send_buffered(self, message_type: str, data: bytes = b"") -> None:
+        """Queue a message to go out in a batch within buffer_delay seconds."""
+        self._send_queue.put(self._message(message_type, data))
+        with self._flush_lock:
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        _scheduler.enter(self.buffer_delay, self._flush_tick)
+    
+    def send_json_buffered(self, message_type: str, data: Dict[str, Any]) -> None:
+        """Queue JSON data to go out in a batch."""
+        self.send_buffered(message_type, json_dumps(data))
+    
+    def _flush_tick(self) -> None:
+        with self._flush_lock:
+            self._flush_scheduled = False
+        self.flush()
+    
+    def flush(self) -> bool:
+        """Send all buffered messages now, up to MAX_BATCH_SIZE per RPC."""
+        ok = True
+        while True:
+            batch = []
+            while len(batch) < MAX_BATCH_SIZE:
+                try:
+                    batch.append(self._send_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return ok
+            ok = self._send_batch(batch) and ok
+    
+    def _send_batch(self, batch: List[common_pb2.Message]) -> bool:
+        if not self._connected:
+            self._stats["failed"] += len(batch)
+            return False
+        
+        try:
+            data = common_pb2.ContactData(messages=batch).SerializeToString()
+            self._pool.next_stub().Process(self._message("batch", data), timeout=30)
+            self._stats["sent"] += len(batch)
+            return True
+        except Exception as e:
+            logger.error("Batch send failed: %s", e)
+            self._stats["failed"] += len(batch)
+            self._connected = False
+            return False
     
     def _heartbeat(self) -> bool:
         try:
-            msg = common_pb2.Message(
-                message_type="heartbeat",
-                source=common_pb2.Address(client_id=self.client_id.encode()),
-            )
-            self._stub.Process(msg, timeout=5)
+            self._pool.next_raw_process()(self._hb_bytes, timeout=5)
             self._stats["heartbeats"] += 1
             return True
         except Exception:
             self._connected = False
             return False
     
-    def _heartbeat_loop(self) -> None:
-        reconnect_delay = 5
-        while not self._stop.is_set():
-            if not self._connected:
-                if self.connect() and self.enroll():
-                    reconnect_delay = 5
-                else:
-                    self._stop.wait(reconnect_delay)
-                    reconnect_delay = min(reconnect_delay * 2, 60)
-                    continue
-            
-            self._heartbeat()
-            self._stop.wait(self.heartbeat_interval)
+    def _heartbeat_tick(self, generation: int) -> None:
+        """Run one heartbeat (or reconnect attempt) on a scheduler worker."""
+        if self._stop.is_set() or generation != self._generation:
+            return
+        
+        tick = functools.partial(self._heartbeat_tick, generation)
+        if not self._connected:
+            if self.connect() and self.enroll():
+                self._reconnect_delay = 5
+            else:
+                # Full jitter so a fleet restart doesn't reconnect in lockstep
+                _scheduler.enter(random.uniform(0, self._reconnect_delay), tick)
+                self._reconnect_delay = min(self._reconnect_delay * 2, 60)
+                return
+        
+        deadline = time.monotonic() + self.heartbeat_interval
+        self._heartbeat()
+        _scheduler.enter(max(0.0, deadline - time.monotonic()), tick)
     
     def start(self) -> "FleetClient":
         """Start the client."""
@@ -202,26 +452,148 @@ class FleetClient:
             raise ConnectionError("Cannot enroll")
         
         self._stop.clear()
-        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
-        self._heartbeat_thread.start()
+        self._generation += 1
+        self._reconnect_delay = 5
+        _scheduler.enter(0, functools.partial(self._heartbeat_tick, self._generation))
         
         self._running = True
-        logger.info(f"Client started: {self.client_id}")
+        logger.info("Client started: %s", self.client_id)
         return self
     
     def stop(self) -> None:
         """Stop the client."""
         self._stop.set()
-        if self._heartbeat_thread:
-            self._heartbeat_thread.join(timeout=5)
+        self.flush()
         self.disconnect()
         self._running = False
         logger.info("Client stopped")
     
     def wait(self, timeout: Optional[float] = None) -> None:
         """Wait for client to stop."""
-        if self._heartbeat_thread:
-            self._heartbeat_thread.join(timeout=timeout)
+        self._stop.wait(timeout)
+    
+    # ========================
+    # Async (grpc.aio) API
+    # ========================
+    
+    async def connect_async(self) -> bool:
+        """Connect to server using grpc.aio channels."""
+        try:
+            if self._aio_pool:
+                await asyncio.gather(*(ch.close() for ch in self._aio_pool.channels))
+            self._aio_pool = _ChannelPool(self.server_address, self.pool_size, grpc.aio.insecure_channel)
+            await asyncio.wait_for(
+                asyncio.gather(*(ch.channel_ready() for ch in self._aio_pool.channels)),
+                timeout=10,
+            )
+            self._connected = True
+            logger.info("Connected to %s", self.server_address)
+            return True
+        except Exception as e:
+            logger.error("Connection failed: %s", e)
+            self._connected = False
+            return False
+    
+    async def disconnect_async(self) -> None:
+        """Disconnect grpc.aio channels."""
+        if self._aio_pool:
+            await asyncio.gather(*(ch.close() for ch in self._aio_pool.channels))
+            self._aio_pool = None
+        self._connected = False
+        self._enrolled = False
+    
+    async def enroll_async(self) -> bool:
+        """Enroll with server."""
+        if not self._connected and not await self.connect_async():
+            return False
+        
+        try:
+            msg = self._message("enrollment", json_dumps(self._cached_system_info))
+            await self._aio_pool.next_stub().Process(msg, timeout=30)
+            self._enrolled = True
+            logger.info("Enrolled as %s", self.client_id)
+            return True
+        except Exception as e:
+            logger.error("Enrollment failed: %s", e)
+            return False
+    
+    async def send_async(self, message_type: str, data: bytes = b"") -> bool:
+        """Send message to server."""
+        if not self._connected:
+            return False
+        
+        try:
+            await self._aio_pool.next_stub().Process(self._message(message_type, data), timeout=30)
+            self._stats["sent"] += 1
+            return True
+        except Exception as e:
+            logger.error("Send failed: %s", e)
+            self._stats["failed"] += 1
+            self._connected = False
+            return False
+    
+    async def send_json_async(self, message_type: str, data: Dict[str, Any]) -> bool:
+        """Send JSON data."""
+        return await self.send_async(message_type, json_dumps(data))
+    
+    async def _heartbeat_async(self) -> bool:
+        try:
+            await self._aio_pool.next_raw_process()(self._hb_bytes, timeout=5)
+            self._stats["heartbeats"] += 1
+            return True
+        except Exception:
+            self._connected = False
+            return False
+    
+    async def _wait_stop(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._async_stop.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _heartbeat_loop_async(self) -> None:
+        reconnect_delay = 5
+        while not self._async_stop.is_set():
+            if not self._connected:
+                if await self.connect_async() and await self.enroll_async():
+                    reconnect_delay = 5
+                else:
+                    await self._wait_stop(random.uniform(0, reconnect_delay))
+                    reconnect_delay = min(reconnect_delay * 2, 60)
+                    continue
+            
+            deadline = time.monotonic() + self.heartbeat_interval
+            await self._heartbeat_async()
+            await self._wait_stop(max(0.0, deadline - time.monotonic()))
+    
+    async def start_async(self) -> "FleetClient":
+        """Start the client on the running event loop."""
+        if self._running:
+            raise RuntimeError("Already running")
+        
+        if not await self.connect_async():
+            raise ConnectionError("Cannot connect")
+        
+        if not await self.enroll_async():
+            raise ConnectionError("Cannot enroll")
+        
+        self._async_stop = asyncio.Event()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop_async())
+        
+        self._running = True
+        logger.info("Client started: %s", self.client_id)
+        return self
+    
+    async def stop_async(self) -> None:
+        """Stop a client started with start_async()."""
+        if self._async_stop:
+            self._async_stop.set()
+        if self._heartbeat_task:
+            await self._heartbeat_task
+            self._heartbeat_task = None
+        await self.disconnect_async()
+        self._running = False
+        logger.info("Client stopped")
     
     def stats(self) -> Dict[str, Any]:
         """Get client stats."""
@@ -5,9 +5,40 @@ Common types and utilities shared between server and client.
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, Optional, Set, List
+from typing import Any, Dict, Optional, Set, List, Union
+import base64
 import json
 import os
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serialize to JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+
+def ns_to_datetime(ns: int) -> datetime:
+    """Convert epoch nanoseconds to a naive local datetime."""
+    return datetime.fromtimestamp(ns // 1_000_000_000).replace(microsecond=(ns // 1000) % 1_000_000)
+
+
+def datetime_to_ns(dt: datetime) -> int:
+    """Convert a datetime to epoch nanoseconds."""
+    return int(dt.replace(microsecond=0).timestamp()) * 1_000_000_000 + dt.microsecond * 1000
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """Parse JSON bytes or text, using orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 class ClientStatus(Enum):
@@ -18,6 +49,10 @@ class ClientStatus(Enum):
     ENROLLING = "enrolling"
 
 
+# Plain-dict lookup for hot serialization paths (avoids Enum.value descriptor)
+_STATUS_VALUE: Dict[ClientStatus, str] = {s: s.value for s in ClientStatus}
+
+
 class Priority(Enum):
     """Message priority levels (matches protobuf Message.Priority)."""
     MEDIUM = 0
@@ -25,7 +60,7 @@ class Priority(Enum):
     HIGH = 2
 
 
-@dataclass
+@dataclass(slots=True)
 class Address:
     """
     Identifies the source or destination of a message.
@@ -46,7 +81,7 @@ class Address:
         return cls(client_id=client_id, service_name=d.get("service_name", ""))
 
 
-@dataclass
+@dataclass(slots=True)
 class ValidationInfo:
     """
     Tags for message validation.
@@ -55,7 +90,7 @@ class ValidationInfo:
     tags: Dict[str, str] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class MessageResult:
     """
     Result of message processing.
@@ -66,21 +101,22 @@ class MessageResult:
     failed_reason: str = ""
     
     def to_dict(self) -> Dict[str, Any]:
+        processed = self.processed_time
         return {
-            "processed_time": self.processed_time.isoformat() if self.processed_time else None,
+            "processed_time": processed.isoformat() if processed else None,
             "failed": self.failed,
             "failed_reason": self.failed_reason,
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class AnnotationEntry:
     """Single annotation entry."""
     key: str = ""
     value: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class Annotations:
     """
     Arbitrary key-value metadata.
@@ -88,20 +124,24 @@ class Annotations:
     """
     entries: List["AnnotationEntry"] = field(default_factory=list)
     
+    # key -> value (last entry wins), kept in step with entries by add()
+    _index: Dict[str, str] = field(default_factory=dict, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self._index = {e.key: e.value for e in self.entries}
+    
     def to_dict(self) -> Dict[str, str]:
-        return {e.key: e.value for e in self.entries}
+        return dict(self._index)
     
     def add(self, key: str, value: str) -> None:
         self.entries.append(AnnotationEntry(key=key, value=value))
+        self._index[key] = value
     
     def get(self, key: str, default: str = "") -> str:
-        for e in self.entries:
-            if e.key == key:
-                return e.value
-        return default
+        return self._index.get(key, default)
 
 
-@dataclass
+@dataclass(slots=True)
 class Label:
     """
     Service labels for client classification.
@@ -114,7 +154,7 @@ class Label:
         return {"service_name": self.service_name, "label": self.label}
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientInfo:
     """Information about a connected client."""
     client_id: str
@@ -129,71 +169,95 @@ class ClientInfo:
     enrolled_at: Optional[datetime] = None
     last_seen: Optional[datetime] = None
     last_heartbeat: Optional[datetime] = None
+    # time.monotonic() of last_heartbeat, for timeout checks (immune to wall-clock steps)
+    last_heartbeat_mono: Optional[float] = field(default=None, repr=False, compare=False)
     
     message_count: int = 0
     error_count: int = 0
     
+    # Serialized form of the fields that rarely change (see to_dict)
+    _static_dict: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    
+    def invalidate(self) -> None:
+        """Drop the cached to_dict() snapshot after changing identity fields or tags."""
+        self._static_dict = None
+    
     def to_dict(self) -> Dict[str, Any]:
+        static = self._static_dict
+        if static is None:
+            static = self._static_dict = {
+                "client_id": self.client_id,
+                "hostname": self.hostname,
+                "os_type": self.os_type,
+                "os_version": self.os_version,
+                "agent_version": self.agent_version,
+                "ip_address": self.ip_address,
+                # A tuple: every to_dict() result shares it, so callers can't modify it
+                "tags": tuple(self.tags),
+                "enrolled_at": self.enrolled_at.isoformat() if self.enrolled_at else None,
+            }
+        last_seen = self.last_seen
         return {
-            "client_id": self.client_id,
-            "hostname": self.hostname,
-            "os_type": self.os_type,
-            "os_version": self.os_version,
-            "agent_version": self.agent_version,
-            "ip_address": self.ip_address,
-            "tags": list(self.tags),
-            "status": self.status.value,
-            "enrolled_at": self.enrolled_at.isoformat() if self.enrolled_at else None,
-            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            **static,
+            "status": _STATUS_VALUE[self.status],
+            "last_seen": last_seen.isoformat() if last_seen else None,
             "message_count": self.message_count,
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     """Simple message format for communication."""
     type: str
     source_id: str = ""
     destination_id: str = ""
     data: bytes = b""
-    timestamp: Optional[datetime] = None
+    timestamp_ns: int = 0  # Epoch nanoseconds; defaults to creation time
     
     def __post_init__(self):
-        if self.timestamp is None:
-            self.timestamp = datetime.now()
+        if not self.timestamp_ns:
+            self.timestamp_ns = time.time_ns()
+    
+    @property
+    def timestamp(self) -> datetime:
+        return ns_to_datetime(self.timestamp_ns)
     
     def to_json(self) -> bytes:
-        return json.dumps({
+        return json_dumps({
             "type": self.type,
             "source_id": self.source_id,
             "destination_id": self.destination_id,
-            "data": self.data.decode() if self.data else "",
-            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
-        }).encode()
+            "data": base64.b64encode(self.data).decode("ascii"),
+            "timestamp": self.timestamp.isoformat(),
+        })
     
     @classmethod
     def from_json(cls, data: bytes) -> "Message":
-        d = json.loads(data.decode())
+        d = json_loads(data)
         return cls(
             type=d.get("type", ""),
             source_id=d.get("source_id", ""),
             destination_id=d.get("destination_id", ""),
-            data=d.get("data", "").encode(),
-            timestamp=datetime.fromisoformat(d["timestamp"]) if d.get("timestamp") else None,
+            data=base64.b64decode(d.get("data", "")),
+            timestamp_ns=datetime_to_ns(datetime.fromisoformat(d["timestamp"])) if d.get("timestamp") else 0,
         )
 
 
-@dataclass 
+@dataclass(slots=True)
 class Command:
     """Command to be sent to a client."""
     command_id: str
     command_type: str
     payload: bytes = b""
     target_id: str = ""
-    created_at: Optional[datetime] = None
+    created_at_ns: int = 0  # Epoch nanoseconds; defaults to creation time
     
     def __post_init__(self):
         if not self.command_id:
             self.command_id = os.urandom(16).hex()
-        if self.created_at is None:
-            self.created_at = datetime.now()
+        if not self.created_at_ns:
+            self.created_at_ns = time.time_ns()
+    
+    @property
+    def created_at(self) -> datetime:
+        return ns_to_datetime(self.created_at_ns)
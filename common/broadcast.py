@@ -5,12 +5,12 @@ Matches: fleetspeak.server.admin broadcast-related protobuf definitions.
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import AbstractSet, Any, Dict, FrozenSet, List, Optional, Tuple
 
 from pyfleet.common import Address, Label
 
 
-@dataclass
+@dataclass(slots=True)
 class Broadcast:
     """
     Mass message to multiple clients.
@@ -23,18 +23,34 @@ class Broadcast:
     expiration_time: Optional[datetime] = None
     data: bytes = b""
     
+    # Built from required_labels on first use (see required_set)
+    _required_set: Optional[FrozenSet[Tuple[str, str]]] = field(default=None, init=False, repr=False, compare=False)
+    
     def __post_init__(self):
         if self.source is None:
             self.source = Address()
     
+    @property
+    def required_set(self) -> FrozenSet[Tuple[str, str]]:
+        """(service_name, label) pairs of required_labels."""
+        required = self._required_set
+        if required is None:
+            required = self._required_set = frozenset((l.service_name, l.label) for l in self.required_labels)
+        return required
+    
+    def invalidate(self) -> None:
+        """Drop the cached required_set after changing required_labels."""
+        self._required_set = None
+    
     def to_dict(self) -> Dict[str, Any]:
+        bid, source, expires, data = self.broadcast_id, self.source, self.expiration_time, self.data
         return {
-            "broadcast_id": self.broadcast_id.hex() if self.broadcast_id else "",
-            "source": self.source.to_dict() if self.source else None,
+            "broadcast_id": bid.hex() if bid else "",
+            "source": source.to_dict() if source else None,
             "message_type": self.message_type,
             "required_labels": [lbl.to_dict() for lbl in self.required_labels],
-            "expiration_time": self.expiration_time.isoformat() if self.expiration_time else None,
-            "data": self.data.hex() if self.data else "",
+            "expiration_time": expires.isoformat() if expires else None,
+            "data": data.hex() if data else "",
         }
     
     def is_expired(self) -> bool:
@@ -45,17 +61,16 @@ class Broadcast:
     
     def matches_labels(self, client_labels: List[Label]) -> bool:
         """Check if client labels match required labels."""
-        if not self.required_labels:
+        if not self.required_set:
             return True  # No label requirements means all clients match
-        
-        client_label_set = {(l.service_name, l.label) for l in client_labels}
-        for required in self.required_labels:
-            if (required.service_name, required.label) not in client_label_set:
-                return False
-        return True
+        return self.matches_label_set({(l.service_name, l.label) for l in client_labels})
+    
+    def matches_label_set(self, client_label_set: AbstractSet[Tuple[str, str]]) -> bool:
+        """Like matches_labels, for a prebuilt set of (service_name, label) pairs."""
+        return self.required_set.issubset(client_label_set)
 
 
-@dataclass
+@dataclass(slots=True)
 class CreateBroadcastRequest:
     """Request to create a broadcast."""
     broadcast: Optional[Broadcast] = None
@@ -66,13 +81,13 @@ class CreateBroadcastRequest:
             self.broadcast = Broadcast()
 
 
-@dataclass
+@dataclass(slots=True)
 class ListActiveBroadcastsRequest:
     """Request to list active broadcasts."""
     service_name: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class ListActiveBroadcastsResponse:
     """Response with active broadcasts."""
     broadcasts: List[Broadcast] = field(default_factory=list)
@@ -17,7 +17,7 @@ class CompressionAlgorithm(Enum):
     COMPRESSION_DEFLATE = 1
 
 
-@dataclass
+@dataclass(slots=True)
 class StdParams:
     """
     Stdout/stderr handling configuration.
@@ -28,7 +28,7 @@ class StdParams:
     flush_time_seconds: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class CommunicatorConfig:
     """
     Client communication settings.
@@ -52,7 +52,7 @@ class CommunicatorConfig:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientState:
     """
     Persistent client state.
@@ -70,7 +70,7 @@ class ClientState:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class DaemonServiceConfig:
     """
     Configuration for daemon-managed services.
@@ -100,7 +100,7 @@ class DaemonServiceConfig:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ServiceConfig:
     """
     Server service configuration.
@@ -120,7 +120,7 @@ class ServiceConfig:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ServerComponentsConfig:
     """
     Server components configuration.
@@ -144,7 +144,7 @@ class ServerComponentsConfig:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class InputMessage:
     """
     Input to send to a process.
@@ -154,7 +154,7 @@ class InputMessage:
     args: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class OutputMessage:
     """
     Output from a process.
@@ -172,7 +172,7 @@ class OutputMessage:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class StartupData:
     """
     Sent by daemon service on startup.
@@ -5,11 +5,19 @@ Matches: fleetspeak.monitoring and fleetspeak.server.resource protobuf definitio
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from enum import Enum
-from typing import Any, Dict, Optional
+from enum import IntEnum
+import sys
+from typing import Any, Dict, Optional, Sequence
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-@dataclass
+from pyfleet.common import json_dumps
+
+
+@dataclass(frozen=True, slots=True)
 class AggregatedResourceUsage:
     """
     Aggregated resource usage statistics.
@@ -24,6 +32,41 @@ class AggregatedResourceUsage:
     max_num_fds: int = 0               # Peak file descriptors
     mean_num_fds: float = 0.0          # Average file descriptors
     
+    @classmethod
+    def from_samples(cls, samples: Sequence[Sequence[float]]) -> "AggregatedResourceUsage":
+        """
+        Aggregate raw samples, one row per sample:
+        (user_cpu_rate, system_cpu_rate, resident_memory, num_fds).
+        """
+        if len(samples) == 0:
+            return cls()
+        if np is not None:
+            try:
+                arr = np.asarray(samples, dtype=np.float64)
+            except ValueError:
+                arr = None  # ragged rows
+            if arr is None or arr.ndim != 2 or arr.shape[1] != 4:
+                raise ValueError("expected 4 values per sample")
+            mean = arr.mean(axis=0).tolist()
+            peak = arr.max(axis=0).tolist()
+        else:
+            # zip() would silently truncate ragged rows
+            if any(len(row) != 4 for row in samples):
+                raise ValueError("expected 4 values per sample")
+            cols = list(zip(*samples))
+            mean = [sum(c) / len(c) for c in cols]
+            peak = [max(c) for c in cols]
+        return cls(
+            mean_user_cpu_rate=float(mean[0]),
+            max_user_cpu_rate=float(peak[0]),
+            mean_system_cpu_rate=float(mean[1]),
+            max_system_cpu_rate=float(peak[1]),
+            mean_resident_memory=float(mean[2]),
+            max_resident_memory=int(peak[2]),
+            max_num_fds=int(peak[3]),
+            mean_num_fds=float(mean[3]),
+        )
+    
     def to_dict(self) -> Dict[str, Any]:
         return {
             "mean_user_cpu_rate": self.mean_user_cpu_rate,
@@ -35,9 +78,13 @@ class AggregatedResourceUsage:
             "max_num_fds": self.max_num_fds,
             "mean_num_fds": self.mean_num_fds,
         }
+    
+    def to_json_bytes(self) -> bytes:
+        """JSON encoding of to_dict()."""
+        return json_dumps(self.to_dict())
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ResourceUsageData:
     """
     Full resource usage report.
@@ -52,12 +99,22 @@ class ResourceUsageData:
     debug_status: str = ""
     process_terminated: bool = False
     
+    # Serialized form, built on first to_dict() (safe to keep: the record is frozen)
+    _cached_dict: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    
     def __post_init__(self):
+        # Few distinct scopes/versions across many records; share one str each
+        object.__setattr__(self, "scope", sys.intern(self.scope))
+        object.__setattr__(self, "version", sys.intern(self.version))
         if self.resource_usage is None:
-            self.resource_usage = AggregatedResourceUsage()
+            object.__setattr__(self, "resource_usage", AggregatedResourceUsage())
     
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        """Serialized form; the returned dict is shared and must not be modified."""
+        cached = self._cached_dict
+        if cached is not None:
+            return cached
+        cached = {
             "scope": self.scope,
             "pid": self.pid,
             "version": self.version,
@@ -67,16 +124,22 @@ class ResourceUsageData:
             "debug_status": self.debug_status,
             "process_terminated": self.process_terminated,
         }
+        object.__setattr__(self, "_cached_dict", cached)
+        return cached
+    
+    def to_json_bytes(self) -> bytes:
+        """JSON encoding of to_dict()."""
+        return json_dumps(self.to_dict())
 
 
-class KillReason(Enum):
+class KillReason(IntEnum):
     """Reason for process termination."""
     UNSPECIFIED = 0
     HEARTBEAT_FAILURE = 1
     MEMORY_EXCEEDED = 2
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class KillNotification:
     """
     Process termination notice.
@@ -89,8 +152,19 @@ class KillNotification:
     killed_when: Optional[datetime] = None
     reason: KillReason = KillReason.UNSPECIFIED
     
+    _cached_dict: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def reason_value(self) -> int:
+        """Numeric reason, as carried in the protobuf enum."""
+        return int(self.reason)
+    
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        """Serialized form; the returned dict is shared and must not be modified."""
+        cached = self._cached_dict
+        if cached is not None:
+            return cached
+        cached = {
             "service": self.service,
             "pid": self.pid,
             "version": self.version,
@@ -98,9 +172,15 @@ class KillNotification:
             "killed_when": self.killed_when.isoformat() if self.killed_when else None,
             "reason": self.reason.name,
         }
+        object.__setattr__(self, "_cached_dict", cached)
+        return cached
+    
+    def to_json_bytes(self) -> bytes:
+        """JSON encoding of to_dict()."""
+        return json_dumps(self.to_dict())
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ClientResourceUsageRecord:
     """
     Server-side client resource usage record.
@@ -121,8 +201,17 @@ class ClientResourceUsageRecord:
     mean_num_fds: int = 0
     max_num_fds: int = 0
     
+    _cached_dict: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, "scope", sys.intern(self.scope))
+    
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        """Serialized form; the returned dict is shared and must not be modified."""
+        cached = self._cached_dict
+        if cached is not None:
+            return cached
+        cached = {
             "scope": self.scope,
             "pid": self.pid,
             "process_start_time": self.process_start_time.isoformat() if self.process_start_time else None,
@@ -138,3 +227,9 @@ class ClientResourceUsageRecord:
             "mean_num_fds": self.mean_num_fds,
             "max_num_fds": self.max_num_fds,
         }
+        object.__setattr__(self, "_cached_dict", cached)
+        return cached
+    
+    def to_json_bytes(self) -> bytes:
+        """JSON encoding of to_dict()."""
+        return json_dumps(self.to_dict())
@@ -5,12 +5,19 @@ Matches: fleetspeak.system protobuf definitions.
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from pyfleet.common import Label
 
 
-@dataclass
+@lru_cache(maxsize=4096)
+def _hex(b: bytes) -> str:
+    """Hex-encode IDs/serials/signatures; the same values recur across acks and retransmits."""
+    return b.hex()
+
+
+@dataclass(slots=True)
 class MessageAckData:
     """
     Acknowledgment for received messages.
@@ -19,10 +26,10 @@ class MessageAckData:
     message_ids: List[bytes] = field(default_factory=list)
     
     def to_dict(self) -> Dict[str, Any]:
-        return {"message_ids": [mid.hex() for mid in self.message_ids]}
+        return {"message_ids": [_hex(mid) for mid in self.message_ids]}
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class MessageErrorData:
     """
     Error notification for failed messages.
@@ -33,12 +40,12 @@ class MessageErrorData:
     
     def to_dict(self) -> Dict[str, Any]:
         return {
-            "message_id": self.message_id.hex() if self.message_id else "",
+            "message_id": _hex(self.message_id) if self.message_id else "",
             "error": self.error,
         }
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ServiceID:
     """Service identifier with signature."""
     name: str = ""
@@ -47,11 +54,11 @@ class ServiceID:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "name": self.name,
-            "signature": self.signature.hex() if self.signature else "",
+            "signature": _hex(self.signature) if self.signature else "",
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientInfoData:
     """
     Client information sent during enrollment.
@@ -67,7 +74,7 @@ class ClientInfoData:
         }
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class RemoveServiceData:
     """
     Request to remove a service.
@@ -76,7 +83,7 @@ class RemoveServiceData:
     name: str = ""
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DieRequest:
     """
     Request to terminate client.
@@ -85,7 +92,7 @@ class DieRequest:
     force: bool = False
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class RestartServiceRequest:
     """
     Request to restart a service.
@@ -94,28 +101,48 @@ class RestartServiceRequest:
     name: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class RevokedCertificateList:
     """
     List of revoked certificates.
     Matches: fleetspeak.system.RevokedCertificateList
     """
-    serials: List[bytes] = field(default_factory=list)
+    # Read-only, in revocation order; add serials with revoke()/revoke_many()
+    serials: Tuple[bytes, ...] = ()
+    
+    # Membership index over serials, rebuilt whenever serials is assigned
+    _index: Set[bytes] = field(init=False, repr=False, compare=False)
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name == "serials":
+            value = tuple(value)
+            object.__setattr__(self, "_index", set(value))
+        object.__setattr__(self, name, value)
     
     def to_dict(self) -> Dict[str, Any]:
-        return {"serials": [s.hex() for s in self.serials]}
+        return {"serials": [_hex(s) for s in self.serials]}
     
     def is_revoked(self, serial: bytes) -> bool:
         """Check if a certificate serial is revoked."""
-        return serial in self.serials
+        return serial in self._index
     
     def revoke(self, serial: bytes) -> None:
         """Add a certificate serial to the revoked list."""
-        if serial not in self.serials:
-            self.serials.append(serial)
+        if serial not in self._index:
+            self._index.add(serial)
+            object.__setattr__(self, "serials", self.serials + (serial,))
+    
+    def revoke_many(self, serials: Iterable[bytes]) -> None:
+        """Add many serials in one pass (e.g. loading a full CRL), keeping first-seen order."""
+        index = self._index
+        new = [s for s in dict.fromkeys(serials) if s not in index]
+        if not new:
+            return
+        index.update(new)
+        object.__setattr__(self, "serials", self.serials + tuple(new))
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientServiceConfig:
     """
     Service configuration pushed to client.
@@ -137,13 +164,13 @@ class ClientServiceConfig:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientServiceConfigs:
     """Multiple service configurations."""
     configs: List[ClientServiceConfig] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SignedClientServiceConfig:
     """
     Signed service configuration.
@@ -2,59 +2,483 @@
 PyFleet Database - Simple SQLite persistence for enrollment tokens.
 """
 
-import sqlite3
+import asyncio
+import functools
+import logging
+import os
+import queue
 import secrets
 import string
 import threading
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict, Any
 from contextlib import contextmanager
 
+from pyfleet.common import json_dumps, json_loads
+
+try:
+    # Same DB-API as the stdlib module, bundling a current SQLite build
+    from pysqlite3 import dbapi2 as sqlite3
+except ImportError:
+    import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Random byte -> token character; bytes >= 248 (62 * 4) are dropped so the mapping stays uniform
+_TOKEN_ALPHABET = (string.ascii_letters + string.digits).encode()
+_TOKEN_TABLE = bytes(_TOKEN_ALPHABET[b % len(_TOKEN_ALPHABET)] for b in range(256))
+_TOKEN_REJECT = bytes(range(256 - 256 % len(_TOKEN_ALPHABET), 256))
+
+_TOKEN_COLUMNS = "id, name, token, created_at, expires_at, max_uses, use_count, active"
+
+# Timestamp columns per table, stored as INTEGER epoch ms (older databases used ISO-8601 TEXT)
+_TIMESTAMP_COLUMNS = {
+    'enrollment_tokens': ('created_at', 'expires_at'),
+    'broadcasts': ('created_at', 'expires_at'),
+    'clients': ('enrolled_at', 'last_seen', 'last_heartbeat'),
+    'events': ('created_at',),
+    'settings': ('updated_at',),
+}
+
+# Tables whose rows were split across several tables; a migrated old table's columns
+# are copied into each of these (client_live holds the per-heartbeat columns)
+_TABLE_SPLITS = {
+    'clients': ('clients', 'client_live'),
+}
+
+# Buffered event rows are written once this many are pending, or after this many seconds;
+# buffered client heartbeats/message counts are written on the same interval
+EVENT_BATCH_SIZE = 64
+EVENT_FLUSH_INTERVAL = 0.25
+
+# Planner statistics are refreshed (ANALYZE) after this many event inserts
+ANALYZE_EVERY = 10_000
+
+# validate_token() remembers valid tokens for this many seconds, up to this many entries
+TOKEN_CACHE_TTL = 5.0
+TOKEN_CACHE_SIZE = 4096
+
+# Naive local ISO-8601 text -> epoch ms, for migrating old rows
+_ISO_TO_MS_SQL = "CAST(ROUND((julianday({0}, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+# Client status is stored as a small integer; the API still speaks the names
+_STATUS_CODES = {'enrolling': 0, 'online': 1, 'offline': 2, 'degraded': 3}
+_STATUS_NAMES = {code: name for name, code in _STATUS_CODES.items()}
+# Status name -> code, for migrating old rows (unknown names become 'enrolling')
+_STATUS_TO_CODE_SQL = "CASE {0} " + " ".join(f"WHEN '{n}' THEN {c}" for n, c in _STATUS_CODES.items()) + " ELSE 0 END"
+
+
+def _now_ms() -> int:
+    """Current time as integer epoch milliseconds."""
+    return time.time_ns() // 1_000_000
+
+
+def _ms_to_iso(ms: Optional[int]) -> Optional[str]:
+    """Epoch milliseconds to a local ISO-8601 string, as served to the dashboard."""
+    return datetime.fromtimestamp(ms / 1000).isoformat() if ms is not None else None
+
+
+def _token_to_dict(r: tuple) -> Dict[str, Any]:
+    """Build a token dict from a plain tuple row selected with _TOKEN_COLUMNS."""
+    return {
+        'id': r[0],
+        'name': r[1],
+        'token': r[2],
+        'created_at': _ms_to_iso(r[3]),
+        'expires_at': _ms_to_iso(r[4]),
+        'max_uses': r[5],
+        'use_count': r[6],
+        'active': r[7],
+    }
+
+
+# Explicit column lists for the remaining tables; rows are fetched as plain tuples
+# (row_factory = None) and turned into dicts by index in the builders below
+_BROADCAST_COLUMNS = "id, message_type, data, required_labels, source_service, created_at, expires_at, active"
+_CLIENT_COLUMNS = (
+    "client_id, hostname, os_type, os_version, agent_version, ip_address, tags, status, "
+    "enrolled_at, last_seen, last_heartbeat, message_count, error_count"
+)
+_EVENT_COLUMNS = "id, type, client_id, hostname, message, data, created_at"
+
+
+def _broadcast_to_dict(r: tuple) -> Dict[str, Any]:
+    """Build a broadcast dict from a tuple row selected with _BROADCAST_COLUMNS."""
+    return {
+        'id': r[0],
+        'message_type': r[1],
+        'data': r[2],
+        'required_labels': json_loads(r[3]) if r[3] else [],
+        'source_service': r[4],
+        'created_at': _ms_to_iso(r[5]),
+        'expires_at': _ms_to_iso(r[6]),
+        'active': r[7],
+    }
+
+
+def _client_to_dict(r: tuple) -> Dict[str, Any]:
+    """Build a client dict from a tuple row selected with _CLIENT_COLUMNS."""
+    return {
+        'client_id': r[0],
+        'hostname': r[1],
+        'os_type': r[2],
+        'os_version': r[3],
+        'agent_version': r[4],
+        'ip_address': r[5],
+        'tags': json_loads(r[6]) if r[6] else [],
+        'status': _STATUS_NAMES.get(r[7]),
+        'enrolled_at': _ms_to_iso(r[8]),
+        'last_seen': _ms_to_iso(r[9]),
+        'last_heartbeat': _ms_to_iso(r[10]),
+        'message_count': r[11],
+        'error_count': r[12],
+    }
+
+
+def _event_to_dict(r: tuple) -> Dict[str, Any]:
+    """Build an event dict from a tuple row selected with _EVENT_COLUMNS."""
+    return {
+        'id': r[0],
+        'type': r[1],
+        'client_id': r[2],
+        'hostname': r[3],
+        'message': r[4],
+        'data': r[5],
+        'created_at': _ms_to_iso(r[6]),
+    }
+
 
 class Database:
     """SQLite database for enrollment tokens."""
     
-    def __init__(self, db_path: str = "pyfleet.db"):
+    # Statements are built once so every call passes the same string and hits the
+    # connection's prepared-statement cache
+    
+    # Tokens
+    SQL_INSERT_TOKEN = """
+        INSERT INTO enrollment_tokens (id, name, token, created_at, expires_at, max_uses)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """
+    SQL_GET_TOKENS = f"SELECT {_TOKEN_COLUMNS} FROM enrollment_tokens ORDER BY created_at DESC"
+    SQL_GET_TOKEN = f"SELECT {_TOKEN_COLUMNS} FROM enrollment_tokens WHERE id = ?"
+    SQL_VALIDATE_TOKEN = f"""
+        UPDATE enrollment_tokens SET use_count = use_count + 1
+        WHERE token = ? AND active = 1
+          AND (expires_at IS NULL OR expires_at > ?)
+          AND (max_uses = -1 OR use_count < max_uses)
+        RETURNING {_TOKEN_COLUMNS}
+    """
+    SQL_ADD_TOKEN_USES = "UPDATE enrollment_tokens SET use_count = use_count + ? WHERE id = ?"
+    SQL_REVOKE_TOKEN = "UPDATE enrollment_tokens SET active = 0 WHERE id = ?"
+    SQL_DELETE_TOKEN = "DELETE FROM enrollment_tokens WHERE id = ?"
+    SQL_PURGE_TOKENS = """
+        DELETE FROM enrollment_tokens
+        WHERE active = 0 OR (expires_at IS NOT NULL AND expires_at < ?)
+    """
+    
+    # Broadcasts
+    SQL_INSERT_BROADCAST = """
+        INSERT INTO broadcasts (id, message_type, data, required_labels, source_service, created_at, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    SQL_GET_ACTIVE_BROADCASTS = f"""
+        SELECT {_BROADCAST_COLUMNS} FROM broadcasts
+        WHERE active = 1 AND (expires_at IS NULL OR expires_at > ?)
+        ORDER BY created_at DESC
+    """
+    SQL_NEXT_BROADCAST_EXPIRY = "SELECT MIN(expires_at) FROM broadcasts WHERE active = 1 AND expires_at > ?"
+    # Active broadcasts with no required labels, or sharing a label with the JSON array bound last
+    SQL_GET_BROADCASTS_FOR_TAGS = f"""
+        SELECT {_BROADCAST_COLUMNS} FROM broadcasts AS b
+        WHERE active = 1 AND (expires_at IS NULL OR expires_at > ?)
+          AND (
+            required_labels IS NULL OR json_array_length(required_labels) = 0
+            OR EXISTS (
+                SELECT 1 FROM json_each(b.required_labels) AS r
+                JOIN json_each(?) AS t ON t.value = r.value
+            )
+          )
+        ORDER BY created_at DESC
+    """
+    SQL_GET_ALL_BROADCASTS = f"SELECT {_BROADCAST_COLUMNS} FROM broadcasts ORDER BY created_at DESC"
+    SQL_GET_BROADCAST = f"SELECT {_BROADCAST_COLUMNS} FROM broadcasts WHERE id = ?"
+    SQL_DELETE_BROADCAST = "DELETE FROM broadcasts WHERE id = ?"
+    SQL_DEACTIVATE_BROADCAST = "UPDATE broadcasts SET active = 0 WHERE id = ?"
+    
+    # Clients: profile columns live in clients, the per-heartbeat ones in client_live
+    SQL_GET_CLIENT = f"SELECT {_CLIENT_COLUMNS} FROM clients LEFT JOIN client_live USING (client_id) WHERE client_id = ?"
+    SQL_UPSERT_CLIENT = """
+        INSERT INTO clients (client_id, hostname, os_type, os_version, agent_version, ip_address, tags, enrolled_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(client_id) DO UPDATE SET
+            hostname = excluded.hostname, os_type = excluded.os_type, os_version = excluded.os_version,
+            agent_version = excluded.agent_version, ip_address = excluded.ip_address, tags = excluded.tags
+    """
+    SQL_UPSERT_CLIENT_LIVE = """
+        INSERT INTO client_live (client_id, status, last_seen) VALUES (?, ?, ?)
+        ON CONFLICT(client_id) DO UPDATE SET status = excluded.status, last_seen = excluded.last_seen
+    """
+    SQL_GET_CLIENTS_BY_STATUS = f"""
+        SELECT {_CLIENT_COLUMNS} FROM client_live JOIN clients USING (client_id)
+        WHERE status = ? ORDER BY last_seen DESC
+    """
+    SQL_GET_ALL_CLIENTS = f"SELECT {_CLIENT_COLUMNS} FROM clients LEFT JOIN client_live USING (client_id) ORDER BY last_seen DESC"
+    SQL_UPDATE_HEARTBEAT = f"UPDATE client_live SET last_heartbeat = ?, last_seen = ?, status = {_STATUS_CODES['online']} WHERE client_id = ?"
+    SQL_UPDATE_CLIENT_STATUS = "UPDATE client_live SET status = ? WHERE client_id = ?"
+    SQL_INCREMENT_MESSAGES = "UPDATE client_live SET message_count = message_count + ?, last_seen = ? WHERE client_id = ?"
+    SQL_DELETE_CLIENT = "DELETE FROM clients WHERE client_id = ?"
+    SQL_DELETE_CLIENT_LIVE = "DELETE FROM client_live WHERE client_id = ?"
+    # One pass over idx_client_live_status (covering: no table rows are read)
+    SQL_CLIENT_STATS = f"""
+        SELECT
+            COUNT(*) FILTER (WHERE status = {_STATUS_CODES['online']}),
+            COUNT(*) FILTER (WHERE status = {_STATUS_CODES['offline']}),
+            COUNT(*) FILTER (WHERE status = {_STATUS_CODES['degraded']}),
+            COUNT(*) FILTER (WHERE status = {_STATUS_CODES['enrolling']}),
+            COUNT(*)
+        FROM client_live
+    """
+    
+    # Events
+    SQL_INSERT_EVENT = """
+        INSERT INTO events (type, client_id, hostname, message, data, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """
+    # id breaks ties between events written in the same millisecond
+    SQL_GET_EVENTS_BY_TYPE = f"SELECT {_EVENT_COLUMNS} FROM events WHERE type = ? ORDER BY created_at DESC, id DESC LIMIT ?"
+    SQL_GET_EVENTS = f"SELECT {_EVENT_COLUMNS} FROM events ORDER BY created_at DESC, id DESC LIMIT ?"
+    SQL_CLEAR_EVENTS = "DELETE FROM events"
+    SQL_TRIM_EVENTS = "DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?"
+    
+    # Settings
+    SQL_GET_SETTING = "SELECT value FROM settings WHERE key = ?"
+    SQL_SET_SETTING = """
+        INSERT OR REPLACE INTO settings (key, value, updated_at)
+        VALUES (?, ?, ?)
+    """
+    SQL_GET_ALL_SETTINGS = "SELECT key, value FROM settings"
+    
+    def __init__(self, db_path: str = "pyfleet.db", pool_size: int = 8, event_cap: int = 100_000):
         self.db_path = db_path
-        self._local = threading.local()
+        # Only the newest event_cap events are kept (trimmed by id after each batch)
+        self._event_cap = event_cap
+        # Idle connections; at most pool_size are kept, extras are closed on return
+        self._pool: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+        self._pool_size = pool_size
+        self._purge_stop = threading.Event()
+        self._purge_thread: Optional[threading.Thread] = None
         self._init_db()
+        
+        # Writes coalesced in memory until flush(); SQLite assigns event ids on insert,
+        # so several processes can share the file
+        self._event_buf: List[tuple] = []
+        self._event_buf_since = 0.0
+        self._hb_pending: Dict[str, int] = {}          # client_id -> last heartbeat (epoch ms)
+        self._msg_pending: Dict[str, List[int]] = {}   # client_id -> [message count delta, last seen ms]
+        self._token_uses_pending: Dict[str, int] = {}  # token id -> use_count delta
+        self._buf_lock = threading.Lock()
+        self._events_since_analyze = 0
+        
+        # token -> [monotonic deadline, token row], for tokens without max_uses only: hits
+        # are validated and counted in memory, with the use_count increment written by
+        # flush(). Tokens with a use limit always take the atomic UPDATE ... RETURNING.
+        self._token_cache: Dict[str, list] = {}
+        self._token_cache_lock = threading.Lock()
+        
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
     
-    def _get_conn(self) -> sqlite3.Connection:
-        """Get thread-local database connection."""
-        if not hasattr(self._local, 'conn'):
-            self._local.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            self._local.conn.row_factory = sqlite3.Row
-        return self._local.conn
+    def _new_conn(self) -> sqlite3.Connection:
+        """Open a connection with the pragmas applied once."""
+        # Autocommit mode; _cursor() opens transactions explicitly
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None, cached_statements=256,
+        )
+        conn.row_factory = sqlite3.Row
+        # Only takes effect when this connection creates the file; must precede WAL
+        conn.execute("PRAGMA page_size=8192")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # Serve reads straight from a 256 MiB mapping of the file; ~40 MB page cache
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA cache_size=-40000")
+        # Wait for a competing writer instead of failing with "database is locked"
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
     
     @contextmanager
-    def _cursor(self):
-        """Context manager for database cursor."""
-        conn = self._get_conn()
+    def _ro_cursor(self):
+        """Context manager for a cursor on a pooled connection, outside any explicit transaction.
+        
+        For read-only methods: each statement runs in its own implicit read
+        transaction, so no write lock is taken and nothing is committed.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._new_conn()
         cursor = conn.cursor()
         try:
             yield cursor
-            conn.commit()
-        except Exception:
-            conn.rollback()
-            raise
         finally:
             cursor.close()
+            if self._pool.qsize() < self._pool_size:
+                self._pool.put(conn)
+            else:
+                conn.close()
+    
+    @contextmanager
+    def _cursor(self):
+        """Context manager for a cursor on a pooled connection, in one write transaction."""
+        with self._ro_cursor() as cursor:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+    
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(timeout=EVENT_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Database flush failed")
+    
+    def flush(self) -> None:
+        """Write buffered events, heartbeats and message counts to the database."""
+        with self._buf_lock:
+            events, self._event_buf = self._event_buf, []
+            heartbeats, self._hb_pending = self._hb_pending, {}
+            messages, self._msg_pending = self._msg_pending, {}
+            token_uses, self._token_uses_pending = self._token_uses_pending, {}
+        if not (events or heartbeats or messages or token_uses):
+            return
+        try:
+            with self._cursor() as cur:
+                if events:
+                    cur.executemany(self.SQL_INSERT_EVENT, events)
+                    cur.execute(self.SQL_TRIM_EVENTS, (self._event_cap,))
+                if heartbeats:
+                    cur.executemany(self.SQL_UPDATE_HEARTBEAT, [(ms, ms, cid) for cid, ms in heartbeats.items()])
+                if messages:
+                    cur.executemany(self.SQL_INCREMENT_MESSAGES, [(n, ms, cid) for cid, (n, ms) in messages.items()])
+                if token_uses:
+                    cur.executemany(self.SQL_ADD_TOKEN_USES, [(n, tid) for tid, n in token_uses.items()])
+        except Exception:
+            # The transaction rolled back: put the batch back for the next flush
+            self._requeue(events, heartbeats, messages, token_uses)
+            raise
+        
+        # Unlocked counter: concurrent flushes may rarely ANALYZE twice, which is harmless
+        self._events_since_analyze += len(events)
+        if self._events_since_analyze >= ANALYZE_EVERY:
+            self._events_since_analyze = 0
+            with self._cursor() as cur:
+                cur.execute("ANALYZE events")
+                cur.execute("ANALYZE client_live")
+    
+    def _requeue(
+        self,
+        events: List[tuple],
+        heartbeats: Dict[str, int],
+        messages: Dict[str, List[int]],
+        token_uses: Dict[str, int],
+    ) -> None:
+        """Return a batch taken by a failed flush() to the buffers, merged with newer writes."""
+        with self._buf_lock:
+            if events:
+                if not self._event_buf:
+                    self._event_buf_since = time.monotonic()
+                self._event_buf = events + self._event_buf
+            # Heartbeats recorded since the failed flush are newer and win
+            self._hb_pending = {**heartbeats, **self._hb_pending}
+            pending = self._msg_pending
+            for cid, (n, ms) in messages.items():
+                newer = pending.get(cid)
+                if newer is None:
+                    pending[cid] = [n, ms]
+                else:
+                    newer[0] += n
+            uses = self._token_uses_pending
+            for tid, n in token_uses.items():
+                uses[tid] = uses.get(tid, 0) + n
+    
+    def close(self) -> None:
+        """Flush pending writes, stop background threads and close pooled connections."""
+        self._closed.set()
+        self._flusher.join(timeout=5)
+        self.stop_purge()
+        self.flush()
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            # Let SQLite refresh statistics for the queries this connection ran
+            try:
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                logger.exception("PRAGMA optimize failed")
+            conn.close()
     
     def _init_db(self):
         """Initialize database schema."""
         with self._cursor() as cur:
+            # Tables moved aside to be rebuilt: (table, old copy, old copy has TEXT timestamps).
+            # Rows are copied into the new layout after CREATE below.
+            migrate = []
+            
+            def set_aside(table: str, old: str, text_timestamps: bool) -> None:
+                cur.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                    (table,),
+                )
+                for index in [r[0] for r in cur.fetchall()]:
+                    cur.execute(f"DROP INDEX {index}")
+                cur.execute(f"ALTER TABLE {table} RENAME TO {old}")
+                migrate.append((table, old, text_timestamps))
+            
+            # Tables still using ISO-8601 TEXT timestamps
+            for table, columns in _TIMESTAMP_COLUMNS.items():
+                cur.execute("SELECT type FROM pragma_table_info(?) WHERE name = ?", (table, columns[0]))
+                row = cur.fetchone()
+                if row is not None and row[0] == 'TEXT':
+                    set_aside(table, f"{table}_text", True)
+            # clients from before client_live, still holding the per-heartbeat columns
+            cur.execute("SELECT 1 FROM pragma_table_info('clients') WHERE name = 'last_heartbeat'")
+            if cur.fetchone() is not None:
+                set_aside('clients', 'clients_wide', False)
+            # client_live from before status codes
+            cur.execute("SELECT type FROM pragma_table_info('client_live') WHERE name = 'status'")
+            row = cur.fetchone()
+            if row is not None and row[0] == 'TEXT':
+                set_aside('client_live', 'client_live_text', False)
+            
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS enrollment_tokens (
                     id TEXT PRIMARY KEY,
                     name TEXT NOT NULL,
                     token TEXT UNIQUE NOT NULL,
-                    created_at TEXT NOT NULL,
-                    expires_at TEXT,
+                    created_at INTEGER NOT NULL,  -- epoch ms
+                    expires_at INTEGER,           -- epoch ms
                     max_uses INTEGER DEFAULT -1,
                     use_count INTEGER DEFAULT 0,
                     active INTEGER DEFAULT 1
                 )
             """)
+            # validate_token uses the UNIQUE(token) autoindex; get_tokens orders by created_at.
+            # An older partial index on token duplicated the autoindex.
+            cur.execute("DROP INDEX IF EXISTS idx_tokens_token_active")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tokens_created
+                ON enrollment_tokens(created_at DESC)
+            """)
             
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS broadcasts (
@@ -63,11 +487,15 @@ class Database:
                     data TEXT,
                     required_labels TEXT,
                     source_service TEXT DEFAULT 'pyfleet',
-                    created_at TEXT NOT NULL,
-                    expires_at TEXT,
+                    created_at INTEGER NOT NULL,  -- epoch ms
+                    expires_at INTEGER,           -- epoch ms
                     active INTEGER DEFAULT 1
                 )
             """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_broadcasts_active_created
+                ON broadcasts(active, created_at DESC)
+            """)
             
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS clients (
@@ -78,13 +506,28 @@ class Database:
                     agent_version TEXT,
                     ip_address TEXT,
                     tags TEXT,
-                    status TEXT DEFAULT 'enrolling',
-                    enrolled_at TEXT,
-                    last_seen TEXT,
-                    last_heartbeat TEXT,
+                    enrolled_at INTEGER  -- epoch ms
+                )
+            """)
+            # Columns written on every heartbeat, kept apart so those updates rewrite a
+            # small row instead of one carrying the client's tags and version strings
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS client_live (
+                    client_id TEXT PRIMARY KEY,
+                    status INTEGER DEFAULT 0,  -- _STATUS_CODES
+                    last_seen INTEGER,       -- epoch ms
+                    last_heartbeat INTEGER,  -- epoch ms
                     message_count INTEGER DEFAULT 0,
                     error_count INTEGER DEFAULT 0
-                )
+                ) WITHOUT ROWID
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_client_live_status
+                ON client_live(status, last_seen DESC)
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_client_live_last_seen
+                ON client_live(last_seen DESC)
             """)
             
             cur.execute("""
@@ -95,95 +538,207 @@ class Database:
                     hostname TEXT,
                     message TEXT,
                     data TEXT,
-                    created_at TEXT NOT NULL
+                    created_at INTEGER NOT NULL  -- epoch ms
                 )
             """)
+            # Match the event queries' ORDER BY created_at DESC, id DESC so no sort step is needed;
+            # the older indexes without id are replaced
+            cur.execute("DROP INDEX IF EXISTS idx_events_type_created")
+            cur.execute("DROP INDEX IF EXISTS idx_events_created")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_events_type_created_id
+                ON events(type, created_at DESC, id DESC)
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_events_created_id
+                ON events(created_at DESC, id DESC)
+            """)
             
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS settings (
                     key TEXT PRIMARY KEY,
                     value TEXT NOT NULL,
-                    updated_at TEXT
+                    updated_at INTEGER  -- epoch ms
                 )
             """)
+            
+            for table, old, text_timestamps in migrate:
+                cur.execute("SELECT name, type FROM pragma_table_info(?)", (old,))
+                old_columns = dict(cur.fetchall())
+                # Column -> conversion for values in the old format
+                convert = {c: _ISO_TO_MS_SQL for c in _TIMESTAMP_COLUMNS.get(table, ()) if text_timestamps}
+                if old_columns.get('status') == 'TEXT':
+                    convert['status'] = _STATUS_TO_CODE_SQL
+                for dest in _TABLE_SPLITS.get(table, (table,)):
+                    cur.execute("SELECT name FROM pragma_table_info(?)", (dest,))
+                    columns = [r[0] for r in cur.fetchall() if r[0] in old_columns]
+                    select = ", ".join(convert[c].format(c) if c in convert else c for c in columns)
+                    cur.execute(f"INSERT INTO {dest} ({', '.join(columns)}) SELECT {select} FROM {old}")
+                cur.execute(f"DROP TABLE {old}")
     
     def _generate_token(self, length: int = 32) -> str:
         """Generate secure random token."""
-        chars = string.ascii_letters + string.digits
-        return ''.join(secrets.choice(chars) for _ in range(length))
+        token = b''
+        while len(token) < length:
+            token += secrets.token_bytes(length + 8).translate(_TOKEN_TABLE, _TOKEN_REJECT)
+        return token[:length].decode('ascii')
     
     def create_token(self, name: str, expires_hours: int = None, max_uses: int = -1) -> Dict[str, Any]:
         """Create enrollment token."""
         token_id = secrets.token_hex(8)
         token = self._generate_token()
-        now = datetime.now()
-        expires_at = (now + timedelta(hours=expires_hours)).isoformat() if expires_hours else None
+        now_ms = _now_ms()
+        expires_at = now_ms + expires_hours * 3_600_000 if expires_hours else None
+        row = (token_id, name, token, now_ms, expires_at, max_uses)
         
         with self._cursor() as cur:
-            cur.execute("""
-                INSERT INTO enrollment_tokens (id, name, token, created_at, expires_at, max_uses)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (token_id, name, token, now.isoformat(), expires_at, max_uses))
+            cur.execute(self.SQL_INSERT_TOKEN, row)
         
-        return {
-            'id': token_id,
-            'name': name,
-            'token': token,
-            'created_at': now.isoformat(),
-            'expires_at': expires_at,
-            'max_uses': max_uses,
-            'use_count': 0,
-            'active': 1
-        }
+        return _token_to_dict(row + (0, 1))
+    
+    def create_token_bulk(self, names: List[str], expires_hours: int = None, max_uses: int = -1) -> List[Dict[str, Any]]:
+        """Create one enrollment token per name in a single transaction."""
+        now_ms = _now_ms()
+        expires_at = now_ms + expires_hours * 3_600_000 if expires_hours else None
+        rows = [
+            (secrets.token_hex(8), name, self._generate_token(), now_ms, expires_at, max_uses)
+            for name in names
+        ]
+        
+        with self._cursor() as cur:
+            cur.executemany(self.SQL_INSERT_TOKEN, rows)
+        
+        return [_token_to_dict(r + (0, 1)) for r in rows]
     
     def get_tokens(self) -> List[Dict[str, Any]]:
         """Get all tokens."""
-        with self._cursor() as cur:
-            cur.execute("SELECT * FROM enrollment_tokens ORDER BY created_at DESC")
-            return [dict(row) for row in cur.fetchall()]
+        self.flush()
+        with self._ro_cursor() as cur:
+            cur.row_factory = None
+            cur.execute(self.SQL_GET_TOKENS)
+            return [_token_to_dict(r) for r in cur.fetchall()]
     
     def get_token(self, token_id: str) -> Optional[Dict[str, Any]]:
         """Get token by ID."""
-        with self._cursor() as cur:
-            cur.execute("SELECT * FROM enrollment_tokens WHERE id = ?", (token_id,))
+        self.flush()
+        with self._ro_cursor() as cur:
+            cur.row_factory = None
+            cur.execute(self.SQL_GET_TOKEN, (token_id,))
             row = cur.fetchone()
-            return dict(row) if row else None
+            return _token_to_dict(row) if row else None
     
     def validate_token(self, token: str) -> Optional[Dict[str, Any]]:
         """Validate token for enrollment. Returns token data if valid."""
-        with self._cursor() as cur:
-            cur.execute("SELECT * FROM enrollment_tokens WHERE token = ? AND active = 1", (token,))
-            row = cur.fetchone()
-            if not row:
-                return None
-            
-            data = dict(row)
-            
-            # Check expiry
-            if data['expires_at']:
-                if datetime.now() > datetime.fromisoformat(data['expires_at']):
+        now_ms = _now_ms()
+        with self._token_cache_lock:
+            cache = self._token_cache
+            entry = cache.get(token)
+            if entry is not None and entry[0] > time.monotonic():
+                row = entry[1]
+                expires_at = row[4]
+                if expires_at is not None and expires_at <= now_ms:
                     return None
+                row = entry[1] = row[:6] + (row[6] + 1,) + row[7:]
+                with self._buf_lock:
+                    self._token_uses_pending[row[0]] = self._token_uses_pending.get(row[0], 0) + 1
+                return _token_to_dict(row)
             
-            # Check max uses
-            if data['max_uses'] != -1 and data['use_count'] >= data['max_uses']:
+            # Miss: write queued uses first so the check below sees the real count
+            self.flush()
+            # Check and increment in one statement
+            with self._cursor() as cur:
+                cur.row_factory = None
+                cur.execute(self.SQL_VALIDATE_TOKEN, (token, now_ms))
+                row = cur.fetchone()
+            if not row:
+                cache.pop(token, None)
                 return None
-            
-            # Increment use count
-            cur.execute("UPDATE enrollment_tokens SET use_count = use_count + 1 WHERE id = ?", (data['id'],))
-            return data
+            if row[5] != -1:
+                return _token_to_dict(row)
+            if len(cache) >= TOKEN_CACHE_SIZE:
+                now = time.monotonic()
+                for key in [k for k, e in cache.items() if e[0] <= now]:
+                    del cache[key]
+                if len(cache) >= TOKEN_CACHE_SIZE:
+                    cache.clear()
+            cache[token] = [time.monotonic() + TOKEN_CACHE_TTL, row]
+            return _token_to_dict(row)
+    
+    @contextmanager
+    def _token_write(self):
+        """Drop validate_token's cache and hold it off for a write that changes token state."""
+        with self._token_cache_lock:
+            self._token_cache.clear()
+            yield
+    
+    def validate_tokens(self, tokens: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Validate many tokens at once. Maps each token to its data, or None if invalid."""
+        results: Dict[str, Optional[Dict[str, Any]]] = dict.fromkeys(tokens)
+        unique = list(results)
+        now_ms = _now_ms()
+        with self._token_write():
+            self.flush()
+            with self._cursor() as cur:
+                cur.row_factory = None
+                # Stay under SQLite's historical 999 bound-parameter limit
+                for i in range(0, len(unique), 998):
+                    chunk = unique[i:i + 998]
+                    placeholders = ','.join('?' * len(chunk))
+                    cur.execute(f"""
+                        UPDATE enrollment_tokens SET use_count = use_count + 1
+                        WHERE token IN ({placeholders}) AND active = 1
+                          AND (expires_at IS NULL OR expires_at > ?)
+                          AND (max_uses = -1 OR use_count < max_uses)
+                        RETURNING {_TOKEN_COLUMNS}
+                    """, (*chunk, now_ms))
+                    for row in cur.fetchall():
+                        results[row[2]] = _token_to_dict(row)
+        return results
     
     def revoke_token(self, token_id: str) -> bool:
         """Revoke token."""
-        with self._cursor() as cur:
-            cur.execute("UPDATE enrollment_tokens SET active = 0 WHERE id = ?", (token_id,))
+        with self._token_write(), self._cursor() as cur:
+            cur.execute(self.SQL_REVOKE_TOKEN, (token_id,))
             return cur.rowcount > 0
     
     def delete_token(self, token_id: str) -> bool:
         """Delete token."""
-        with self._cursor() as cur:
-            cur.execute("DELETE FROM enrollment_tokens WHERE id = ?", (token_id,))
+        with self._token_write(), self._cursor() as cur:
+            cur.execute(self.SQL_DELETE_TOKEN, (token_id,))
             return cur.rowcount > 0
     
+    def purge_expired(self, grace_days: int = 7) -> int:
+        """Delete revoked tokens and tokens expired for more than grace_days. Returns count."""
+        cutoff = _now_ms() - grace_days * 86_400_000
+        with self._token_write(), self._cursor() as cur:
+            cur.execute(self.SQL_PURGE_TOKENS, (cutoff,))
+            return cur.rowcount
+    
+    def start_purge(self, interval: float = 3600.0, grace_days: int = 7) -> None:
+        """Run purge_expired() every interval seconds in a daemon thread."""
+        if self._purge_thread and self._purge_thread.is_alive():
+            return
+        
+        def run():
+            while not self._purge_stop.wait(timeout=interval):
+                try:
+                    purged = self.purge_expired(grace_days)
+                    if purged:
+                        logger.info("Purged %d stale tokens", purged)
+                except Exception:
+                    logger.exception("Token purge failed")
+        
+        self._purge_stop.clear()
+        self._purge_thread = threading.Thread(target=run, daemon=True)
+        self._purge_thread.start()
+    
+    def stop_purge(self) -> None:
+        """Stop the background purge thread."""
+        self._purge_stop.set()
+        if self._purge_thread:
+            self._purge_thread.join(timeout=5)
+            self._purge_thread = None
+    
     # ========================
     # Broadcast Methods
     # ========================
@@ -197,18 +752,13 @@ class Database:
         expires_hours: int = None,
     ) -> Dict[str, Any]:
         """Create a broadcast."""
-        import json
-        
         broadcast_id = secrets.token_hex(16)
-        now = datetime.now()
-        expires_at = (now + timedelta(hours=expires_hours)).isoformat() if expires_hours else None
-        labels_json = json.dumps(required_labels or [])
+        now = _now_ms()
+        expires_at = now + expires_hours * 3_600_000 if expires_hours else None
+        labels_json = json_dumps(required_labels or []).decode()
         
         with self._cursor() as cur:
-            cur.execute("""
-                INSERT INTO broadcasts (id, message_type, data, required_labels, source_service, created_at, expires_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (broadcast_id, message_type, data, labels_json, source_service, now.isoformat(), expires_at))
+            cur.execute(self.SQL_INSERT_BROADCAST, (broadcast_id, message_type, data, labels_json, source_service, now, expires_at))
         
         return {
             'id': broadcast_id,
@@ -216,58 +766,52 @@ class Database:
             'data': data,
             'required_labels': required_labels or [],
             'source_service': source_service,
-            'created_at': now.isoformat(),
-            'expires_at': expires_at,
+            'created_at': _ms_to_iso(now),
+            'expires_at': _ms_to_iso(expires_at),
             'active': 1
         }
     
     def get_broadcasts(self, active_only: bool = True) -> List[Dict[str, Any]]:
         """Get all broadcasts."""
-        import json
-        
-        with self._cursor() as cur:
+        with self._ro_cursor() as cur:
+            cur.row_factory = None
             if active_only:
-                cur.execute("SELECT * FROM broadcasts WHERE active = 1 ORDER BY created_at DESC")
+                cur.execute(self.SQL_GET_ACTIVE_BROADCASTS, (_now_ms(),))
             else:
-                cur.execute("SELECT * FROM broadcasts ORDER BY created_at DESC")
-            
-            results = []
-            for row in cur.fetchall():
-                data = dict(row)
-                # Parse labels JSON
-                data['required_labels'] = json.loads(data['required_labels']) if data['required_labels'] else []
-                
-                # Check expiry
-                if active_only and data['expires_at']:
-                    if datetime.now() > datetime.fromisoformat(data['expires_at']):
-                        continue
-                
-                results.append(data)
-            return results
+                cur.execute(self.SQL_GET_ALL_BROADCASTS)
+            return [_broadcast_to_dict(r) for r in cur.fetchall()]
+    
+    def next_broadcast_expiry(self) -> Optional[int]:
+        """Epoch ms at which the next active broadcast expires, or None if none will."""
+        with self._ro_cursor() as cur:
+            cur.execute(self.SQL_NEXT_BROADCAST_EXPIRY, (_now_ms(),))
+            return cur.fetchone()[0]
+    
+    def get_broadcasts_for_tags(self, tags: List[str]) -> List[Dict[str, Any]]:
+        """Get active broadcasts a client with these tags should receive (label match done in SQL)."""
+        with self._ro_cursor() as cur:
+            cur.row_factory = None
+            cur.execute(self.SQL_GET_BROADCASTS_FOR_TAGS, (_now_ms(), json_dumps(list(tags)).decode()))
+            return [_broadcast_to_dict(r) for r in cur.fetchall()]
     
     def get_broadcast(self, broadcast_id: str) -> Optional[Dict[str, Any]]:
         """Get broadcast by ID."""
-        import json
-        
-        with self._cursor() as cur:
-            cur.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+        with self._ro_cursor() as cur:
+            cur.row_factory = None
+            cur.execute(self.SQL_GET_BROADCAST, (broadcast_id,))
             row = cur.fetchone()
-            if not row:
-                return None
-            data = dict(row)
-            data['required_labels'] = json.loads(data['required_labels']) if data['required_labels'] else []
-            return data
+            return _broadcast_to_dict(row) if row else None
     
     def delete_broadcast(self, broadcast_id: str) -> bool:
         """Delete broadcast."""
         with self._cursor() as cur:
-            cur.execute("DELETE FROM broadcasts WHERE id = ?", (broadcast_id,))
+            cur.execute(self.SQL_DELETE_BROADCAST, (broadcast_id,))
             return cur.rowcount > 0
     
     def deactivate_broadcast(self, broadcast_id: str) -> bool:
         """Deactivate broadcast (soft delete)."""
         with self._cursor() as cur:
-            cur.execute("UPDATE broadcasts SET active = 0 WHERE id = ?", (broadcast_id,))
+            cur.execute(self.SQL_DEACTIVATE_BROADCAST, (broadcast_id,))
             return cur.rowcount > 0
     
     # ========================
@@ -286,28 +830,13 @@ class Database:
         status: str = "online",
     ) -> Dict[str, Any]:
         """Insert or update client."""
-        import json
-        
-        now = datetime.now().isoformat()
-        tags_json = json.dumps(tags or [])
+        now = _now_ms()
+        tags_json = json_dumps(tags or []).decode()
         
         with self._cursor() as cur:
-            # Check if exists
-            cur.execute("SELECT * FROM clients WHERE client_id = ?", (client_id,))
-            existing = cur.fetchone()
-            
-            if existing:
-                cur.execute("""
-                    UPDATE clients SET
-                        hostname = ?, os_type = ?, os_version = ?, agent_version = ?,
-                        ip_address = ?, tags = ?, status = ?, last_seen = ?
-                    WHERE client_id = ?
-                """, (hostname, os_type, os_version, agent_version, ip_address, tags_json, status, now, client_id))
-            else:
-                cur.execute("""
-                    INSERT INTO clients (client_id, hostname, os_type, os_version, agent_version, ip_address, tags, status, enrolled_at, last_seen)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (client_id, hostname, os_type, os_version, agent_version, ip_address, tags_json, status, now, now))
+            # enrolled_at is only set on first insert
+            cur.execute(self.SQL_UPSERT_CLIENT, (client_id, hostname, os_type, os_version, agent_version, ip_address, tags_json, now))
+            cur.execute(self.SQL_UPSERT_CLIENT_LIVE, (client_id, _STATUS_CODES[status], now))
         
         return {
             'client_id': client_id,
@@ -318,64 +847,62 @@ class Database:
             'ip_address': ip_address,
             'tags': tags or [],
             'status': status,
-            'last_seen': now
+            'last_seen': _ms_to_iso(now)
         }
     
     def get_clients(self, status: str = None) -> List[Dict[str, Any]]:
         """Get all clients, optionally filtered by status."""
-        import json
-        
-        with self._cursor() as cur:
+        self.flush()
+        with self._ro_cursor() as cur:
+            cur.row_factory = None
             if status:
-                cur.execute("SELECT * FROM clients WHERE status = ? ORDER BY last_seen DESC", (status,))
+                cur.execute(self.SQL_GET_CLIENTS_BY_STATUS, (_STATUS_CODES.get(status, -1),))
             else:
-                cur.execute("SELECT * FROM clients ORDER BY last_seen DESC")
-            
-            results = []
-            for row in cur.fetchall():
-                data = dict(row)
-                data['tags'] = json.loads(data['tags']) if data['tags'] else []
-                results.append(data)
-            return results
+                cur.execute(self.SQL_GET_ALL_CLIENTS)
+            return [_client_to_dict(r) for r in cur.fetchall()]
     
     def get_client(self, client_id: str) -> Optional[Dict[str, Any]]:
         """Get client by ID."""
-        import json
-        
-        with self._cursor() as cur:
-            cur.execute("SELECT * FROM clients WHERE client_id = ?", (client_id,))
+        self.flush()
+        with self._ro_cursor() as cur:
+            cur.row_factory = None
+            cur.execute(self.SQL_GET_CLIENT, (client_id,))
             row = cur.fetchone()
-            if not row:
-                return None
-            data = dict(row)
-            data['tags'] = json.loads(data['tags']) if data['tags'] else []
-            return data
+            return _client_to_dict(row) if row else None
     
     def update_client_heartbeat(self, client_id: str) -> bool:
-        """Update client heartbeat timestamp."""
-        now = datetime.now().isoformat()
-        with self._cursor() as cur:
-            cur.execute("UPDATE clients SET last_heartbeat = ?, last_seen = ?, status = 'online' WHERE client_id = ?", 
-                       (now, now, client_id))
-            return cur.rowcount > 0
+        """Record a client heartbeat (buffered; see flush). Always returns True."""
+        now = _now_ms()
+        with self._buf_lock:
+            self._hb_pending[client_id] = now
+        return True
     
     def update_client_status(self, client_id: str, status: str) -> bool:
         """Update client status."""
+        # Apply earlier heartbeats first so they cannot overwrite this status
+        self.flush()
         with self._cursor() as cur:
-            cur.execute("UPDATE clients SET status = ? WHERE client_id = ?", (status, client_id))
+            cur.execute(self.SQL_UPDATE_CLIENT_STATUS, (_STATUS_CODES[status], client_id))
             return cur.rowcount > 0
     
     def increment_client_messages(self, client_id: str) -> bool:
-        """Increment client message count."""
-        with self._cursor() as cur:
-            cur.execute("UPDATE clients SET message_count = message_count + 1, last_seen = ? WHERE client_id = ?",
-                       (datetime.now().isoformat(), client_id))
-            return cur.rowcount > 0
+        """Increment client message count (buffered; see flush). Always returns True."""
+        now = _now_ms()
+        with self._buf_lock:
+            pending = self._msg_pending.get(client_id)
+            if pending is None:
+                self._msg_pending[client_id] = [1, now]
+            else:
+                pending[0] += 1
+                pending[1] = now
+        return True
     
     def delete_client(self, client_id: str) -> bool:
         """Delete client."""
+        self.flush()
         with self._cursor() as cur:
-            cur.execute("DELETE FROM clients WHERE client_id = ?", (client_id,))
+            cur.execute(self.SQL_DELETE_CLIENT_LIVE, (client_id,))
+            cur.execute(self.SQL_DELETE_CLIENT, (client_id,))
             return cur.rowcount > 0
     
     # ========================
@@ -390,48 +917,59 @@ class Database:
         hostname: str = None,
         data: str = None,
     ) -> Dict[str, Any]:
-        """Add event to log."""
-        now = datetime.now().isoformat()
+        """Add event to log (buffered; see flush). The returned event's id is None until it is written."""
+        now = _now_ms()
         
-        with self._cursor() as cur:
-            cur.execute("""
-                INSERT INTO events (type, client_id, hostname, message, data, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (event_type, client_id, hostname, message, data, now))
-            event_id = cur.lastrowid
+        with self._buf_lock:
+            buf = self._event_buf
+            if not buf:
+                self._event_buf_since = time.monotonic()
+            buf.append((event_type, client_id, hostname, message, data, now))
+            full = len(buf) >= EVENT_BATCH_SIZE or time.monotonic() - self._event_buf_since > EVENT_FLUSH_INTERVAL
+        if full:
+            self.flush()
         
         return {
-            'id': event_id,
+            'id': None,
             'type': event_type,
             'client_id': client_id,
             'hostname': hostname,
             'message': message,
             'data': data,
-            'created_at': now
+            'created_at': _ms_to_iso(now)
         }
     
     def get_events(self, limit: int = 50, event_type: str = None) -> List[Dict[str, Any]]:
         """Get recent events."""
-        with self._cursor() as cur:
+        self.flush()
+        with self._ro_cursor() as cur:
+            cur.row_factory = None
             if event_type:
-                cur.execute("SELECT * FROM events WHERE type = ? ORDER BY created_at DESC LIMIT ?", (event_type, limit))
+                cur.execute(self.SQL_GET_EVENTS_BY_TYPE, (event_type, limit))
             else:
-                cur.execute("SELECT * FROM events ORDER BY created_at DESC LIMIT ?", (limit,))
-            return [dict(row) for row in cur.fetchall()]
+                cur.execute(self.SQL_GET_EVENTS, (limit,))
+            return [_event_to_dict(r) for r in cur.fetchall()]
     
     def clear_events(self) -> int:
         """Clear all events."""
+        self.flush()
         with self._cursor() as cur:
-            cur.execute("DELETE FROM events")
+            cur.execute(self.SQL_CLEAR_EVENTS)
             return cur.rowcount
     
     def get_client_stats(self) -> Dict[str, int]:
         """Get client statistics by status."""
-        with self._cursor() as cur:
-            cur.execute("SELECT status, COUNT(*) as count FROM clients GROUP BY status")
-            stats = {row['status']: row['count'] for row in cur.fetchall()}
-            stats['total'] = sum(stats.values())
-            return stats
+        self.flush()
+        with self._ro_cursor() as cur:
+            cur.execute(self.SQL_CLIENT_STATS)
+            online, offline, degraded, enrolling, total = cur.fetchone()
+            return {
+                'online': online,
+                'offline': offline,
+                'degraded': degraded,
+                'enrolling': enrolling,
+                'total': total,
+            }
     
     # ========================
     # Settings Methods
@@ -439,22 +977,59 @@ class Database:
     
     def get_setting(self, key: str, default: str = None) -> Optional[str]:
         """Get a setting value."""
-        with self._cursor() as cur:
-            cur.execute("SELECT value FROM settings WHERE key = ?", (key,))
+        with self._ro_cursor() as cur:
+            cur.execute(self.SQL_GET_SETTING, (key,))
             row = cur.fetchone()
             return row['value'] if row else default
     
     def set_setting(self, key: str, value: str) -> None:
         """Set a setting value."""
-        now = datetime.now().isoformat()
+        now = _now_ms()
         with self._cursor() as cur:
-            cur.execute("""
-                INSERT OR REPLACE INTO settings (key, value, updated_at)
-                VALUES (?, ?, ?)
-            """, (key, value, now))
+            cur.execute(self.SQL_SET_SETTING, (key, value, now))
     
     def get_all_settings(self) -> Dict[str, str]:
         """Get all settings."""
-        with self._cursor() as cur:
-            cur.execute("SELECT key, value FROM settings")
+        with self._ro_cursor() as cur:
+            cur.execute(self.SQL_GET_ALL_SETTINGS)
             return {row['key']: row['value'] for row in cur.fetchall()}
+
+
+class AsyncDatabase:
+    """
+    asyncio facade over Database.
+    
+    Every public Database method is available as a coroutine. Calls run on a
+    small dedicated thread pool, so SQLite never blocks the event loop. They
+    share the wrapped Database's pooled, pre-configured connections.
+    
+    Example:
+        adb = AsyncDatabase(Database("pyfleet.db"))
+        token = await adb.validate_token(value)
+    """
+    
+    def __init__(self, db: Database, workers: Optional[int] = None):
+        self.db = db
+        workers = workers or 2 * (os.cpu_count() or 1)
+        # Keep one idle connection per worker
+        db._pool_size = max(db._pool_size, workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pyfleet-db")
+    
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(attr, *args, **kwargs))
+        
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
+    
+    async def close(self) -> None:
+        """Close the wrapped Database and stop the worker threads."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.db.close)
+        self._executor.shutdown(wait=False)
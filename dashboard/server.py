@@ -2,20 +2,70 @@
 Dashboard Server - Flask web server with REST API and WebSocket support.
 """
 
+import base64
+import hashlib
 import json
 import logging
 import os
 import threading
+import time
+import zlib
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
-from flask import Flask, jsonify, send_from_directory, request
-from flask_socketio import SocketIO
+from flask import Flask, current_app, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from flask_socketio import SocketIO, join_room
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from pyfleet.common import json_dumps
 
 from .database import Database
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 logger = logging.getLogger(__name__)
 
+# Seconds a polled /api/agents or /api/stats body is reused across requests
+RESPONSE_CACHE_TTL = 0.5
+
+# WebSocket events arriving within this many seconds of the previous emit are
+# sent together, followed by a single agents_update
+EMIT_BATCH_WINDOW = 0.05
+
+
+def _json(payload: Any):
+    """JSON response for the hot list endpoints, encoded in one step without provider dispatch."""
+    return current_app.response_class(json_dumps(payload), mimetype="application/json")
+
+
+class _OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes with orjson when it is installed."""
+    
+    # Stdlib fallback: keep insertion order and drop whitespace (orjson already does both)
+    sort_keys = False
+    compact = True
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def response(self, *args: Any, **kwargs: Any):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        # Bytes straight into the response body; no intermediate str to re-encode
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
+
 
 class DashboardServer:
     """
@@ -29,24 +79,69 @@ class DashboardServer:
         fleet_server,
         host: str = "0.0.0.0",
         port: int = 5000,
+        async_mode: str = "threading",
+        behind_proxy: bool = False,
+        msgpack_updates: bool = False,
     ):
+        if msgpack_updates and msgpack is None:
+            raise RuntimeError("msgpack is not installed")
+        fleet_server.attach_dashboard(self)
         self.fleet_server = fleet_server
+        # Send agent list updates as binary msgpack (agents_update_mp) instead of JSON
+        self._msgpack_updates = msgpack_updates
         self.host = host
         self.port = port
         self.db = Database()
         
+        # endpoint -> (monotonic time built, JSON bytes); cleared whenever _emit_event fires
+        self._response_cache: Dict[str, tuple] = {}
+        
+        # Events waiting for the emit thread (see _emit_event); the condition guards the list
+        self._pending_events: List[Dict[str, Any]] = []
+        self._events_ready = threading.Condition()
+        self._emit_thread: Optional[threading.Thread] = None
+        
+        # Bumped when broadcasts are created, deleted or expire; part of the pending-broadcasts
+        # ETag. The random prefix keeps ETags from a previous run from matching.
+        self._broadcast_epoch = os.urandom(4).hex()
+        self._broadcast_version = 0
+        # Epoch ms when the next active broadcast expires (None: none will); guarded by the lock
+        self._broadcast_next_expiry = self.db.next_broadcast_expiry()
+        self._broadcast_lock = threading.Lock()
+        
         # Load persisted settings
         self._load_settings()
         
         # Flask app
         static_dir = os.path.join(os.path.dirname(__file__), "static")
+        # The page is served from memory; the ETag lets browsers revalidate with a 304
+        with open(os.path.join(static_dir, "index.html"), "rb") as f:
+            self._index_bytes = f.read()
+        if msgpack_updates:
+            # The decoder is only needed for agents_update_mp; pin it with its SRI hash
+            with open(os.path.join(static_dir, "msgpack.js"), "rb") as f:
+                digest = base64.b64encode(hashlib.sha384(f.read()).digest()).decode("ascii")
+            app_tag = b'<script src="/static/app.js"></script>'
+            self._index_bytes = self._index_bytes.replace(
+                app_tag,
+                f'<script src="/static/msgpack.js" integrity="sha384-{digest}"></script>\n    '.encode() + app_tag,
+            )
+        self._index_etag = hashlib.md5(self._index_bytes, usedforsecurity=False).hexdigest()
         self.app = Flask(__name__, static_folder=static_dir)
-        self.app.config["SECRET_KEY"] = os.urandom(24).hex()
+        # jsonify() goes through orjson when available
+        self.app.json = _OrjsonProvider(self.app)
+        self.app.config["SECRET_KEY"] = self._secret_key()
+        if behind_proxy:
+            # Trust one reverse proxy (e.g. nginx serving /static) for client address and scheme
+            self.app.wsgi_app = ProxyFix(self.app.wsgi_app, x_for=1, x_proto=1, x_host=1)
         
-        # Socket.IO for real-time updates
-        self.socketio = SocketIO(self.app, cors_allowed_origins="*", async_mode="threading")
+        # Socket.IO for real-time updates. "eventlet"/"gevent" fan out from one cooperative
+        # loop but need monkey patching at program entry, which gRPC's threads don't
+        # tolerate; only use them when the fleet server runs in another process.
+        self.socketio = SocketIO(self.app, cors_allowed_origins="*", async_mode=async_mode)
         
         self._setup_routes()
+        self._setup_socket_handlers()
         self._setup_hooks()
         
         self._thread: Optional[threading.Thread] = None
@@ -61,19 +156,30 @@ class DashboardServer:
         if off:
             self.fleet_server.clients._offline_timeout = float(off)
     
+    def _secret_key(self) -> str:
+        """Session signing key, generated once and kept in the database so restarts don't invalidate sessions."""
+        key = self.db.get_setting("secret_key")
+        if not key:
+            key = os.urandom(32).hex()
+            self.db.set_setting("secret_key", key)
+        return key
+    
     def _setup_routes(self):
         """Setup REST API routes."""
         
         @self.app.route("/")
         def index():
-            return send_from_directory(self.app.static_folder, "index.html")
+            if request.if_none_match.contains(self._index_etag):
+                response = self.app.response_class(status=304)
+            else:
+                response = self.app.response_class(self._index_bytes, mimetype="text/html")
+            response.set_etag(self._index_etag)
+            response.headers["Cache-Control"] = "public, max-age=60"
+            return response
         
         @self.app.route("/api/agents")
         def get_agents():
-            agents = []
-            for client in self.fleet_server.clients.get_all():
-                agents.append(client.to_dict())
-            return jsonify(agents)
+            return self._cached_json("agents", self.fleet_server.clients.to_json)
         
         @self.app.route("/api/agents/<client_id>")
         def get_agent(client_id):
@@ -84,10 +190,12 @@ class DashboardServer:
         
         @self.app.route("/api/stats")
         def get_stats():
-            stats = self.fleet_server.clients.stats()
-            stats["server_running"] = self.fleet_server.running
-            stats["listen_address"] = self.fleet_server.listen_address
-            return jsonify(stats)
+            def build():
+                stats = self.fleet_server.clients.stats()
+                stats["server_running"] = self.fleet_server.running
+                stats["listen_address"] = self.fleet_server.listen_address
+                return json_dumps(stats)
+            return self._cached_json("stats", build)
         
         @self.app.route("/api/agents/<client_id>/tags", methods=["POST"])
         def add_tag(client_id):
@@ -105,7 +213,7 @@ class DashboardServer:
             for t in tokens:
                 t['token_preview'] = t['token'][:8] + '...'
                 del t['token']
-            return jsonify(tokens)
+            return _json(tokens)
         
         @self.app.route("/api/tokens", methods=["POST"])
         def create_token():
@@ -141,7 +249,7 @@ class DashboardServer:
         @self.app.route("/api/broadcasts")
         def get_broadcasts():
             broadcasts = self.db.get_broadcasts(active_only=True)
-            return jsonify(broadcasts)
+            return _json(broadcasts)
         
         @self.app.route("/api/broadcasts", methods=["POST"])
         def create_broadcast():
@@ -155,6 +263,11 @@ class DashboardServer:
                 data=payload,
                 required_labels=labels,
             )
+            self._broadcasts_changed()
+            
+            # Push to subscribed agents: every agent for unlabeled broadcasts, else those with a matching tag
+            rooms = [f"tag:{label}" for label in labels] if labels else "broadcasts"
+            self.socketio.emit("broadcast", broadcast, to=rooms)
             
             # Add to activity feed
             self.db.add_event(
@@ -168,6 +281,8 @@ class DashboardServer:
         @self.app.route("/api/broadcasts/<broadcast_id>", methods=["DELETE"])
         def delete_broadcast(broadcast_id):
             success = self.db.delete_broadcast(broadcast_id)
+            if success:
+                self._broadcasts_changed()
             return jsonify({"success": success})
         
         # Endpoint for clients to fetch pending broadcasts
@@ -186,26 +301,26 @@ class DashboardServer:
             else:
                 client_tags = client.get('tags', [])
             
-            # Get all broadcasts and filter by labels
-            all_broadcasts = self.db.get_broadcasts(active_only=True)
-            matching = []
-            for b in all_broadcasts:
-                required = b.get('required_labels', [])
-                if not required:
-                    # No label requirements = matches all
-                    matching.append(b)
-                else:
-                    # Check if client has any required label
-                    if any(label in client_tags for label in required):
-                        matching.append(b)
+            # Unchanged since the client's last poll: skip the broadcasts query.
+            # crc32, unlike hash(), gives the same tag digest in every process.
+            tags_digest = zlib.crc32("\0".join(sorted(client_tags)).encode())
+            etag = f"{self._broadcast_epoch}.{self._broadcasts_version()}.{tags_digest:x}"
+            if request.if_none_match.contains(etag):
+                response = self.app.response_class(status=304)
+                response.set_etag(etag)
+                return response
             
-            return jsonify(matching)
+            # No label requirements = matches all, otherwise any shared label
+            matching = self.db.get_broadcasts_for_tags(client_tags)
+            response = _json(matching)
+            response.set_etag(etag)
+            return response
         
         # Events API
         @self.app.route("/api/events")
         def get_events():
             events = self.db.get_events(limit=50)
-            return jsonify(events)
+            return _json(events)
         
         # Settings API
         @self.app.route("/api/settings")
@@ -247,6 +362,21 @@ class DashboardServer:
                 "offline_timeout": self.fleet_server.clients._offline_timeout,
             })
     
+    def _setup_socket_handlers(self):
+        """Setup Socket.IO handlers for dashboards and agents."""
+        
+        @self.socketio.on("subscribe_dashboard")
+        def subscribe_dashboard():
+            # Activity and agent list updates go to this room only, not to agent sockets
+            join_room("dashboard")
+        
+        @self.socketio.on("subscribe_broadcasts")
+        def subscribe_broadcasts(data):
+            # Agents get new broadcasts pushed instead of polling /api/broadcasts/pending
+            join_room("broadcasts")
+            for tag in (data or {}).get("tags") or []:
+                join_room(f"tag:{tag}")
+    
     def _setup_hooks(self):
         """Hook into FleetServer events."""
         
@@ -299,17 +429,85 @@ class DashboardServer:
                 )
                 self._emit_event({"type": "message", "message": f"Message from {client.hostname if client else '?'}: {msg.message_type}"})
     
+    def _cached_json(self, key: str, build: Callable[[], bytes]):
+        """Respond with the JSON bytes from build(), reusing them for RESPONSE_CACHE_TTL seconds."""
+        now = time.monotonic()
+        entry = self._response_cache.get(key)
+        if entry is None or now - entry[0] >= RESPONSE_CACHE_TTL:
+            entry = self._response_cache[key] = (now, build())
+        return current_app.response_class(entry[1], mimetype="application/json")
+    
+    def _broadcasts_changed(self, expired_at: Optional[int] = None):
+        """Bump the pending-broadcasts ETag version after broadcasts change.
+        
+        With expired_at, only bump if that expiry is still the pending one
+        (another request may have handled it already).
+        """
+        with self._broadcast_lock:
+            if expired_at is not None and self._broadcast_next_expiry != expired_at:
+                return
+            self._broadcast_version += 1
+            self._broadcast_next_expiry = self.db.next_broadcast_expiry()
+    
+    def _broadcasts_version(self) -> int:
+        """Current pending-broadcasts ETag version, bumped first if a broadcast has expired."""
+        expiry = self._broadcast_next_expiry
+        if expiry is not None and time.time_ns() // 1_000_000 >= expiry:
+            self._broadcasts_changed(expired_at=expiry)
+        return self._broadcast_version
+    
     def _emit_event(self, event: Dict[str, Any]):
-        """Emit event via WebSocket for real-time updates."""
-        event["timestamp"] = datetime.now().isoformat()
+        """Emit event via WebSocket for real-time updates.
+        
+        Queued for the emit thread, so FleetServer hooks don't wait on WebSocket I/O.
+        An event on an idle server is sent at once; events arriving within
+        EMIT_BATCH_WINDOW of a send go out together in the next one.
+        """
+        # Agent state changed; don't serve a stale cached list
+        self._response_cache.clear()
+        with self._events_ready:
+            self._pending_events.append(event)
+            if self._emit_thread is None:
+                self._emit_thread = threading.Thread(
+                    target=self._emit_loop, name="pyfleet-dashboard-emit", daemon=True,
+                )
+                self._emit_thread.start()
+            self._events_ready.notify()
+    
+    def _emit_loop(self):
+        me = threading.current_thread()
+        while True:
+            with self._events_ready:
+                while not self._pending_events and self._emit_thread is me:
+                    self._events_ready.wait()
+                # stop() unregistered this thread
+                if self._emit_thread is not me:
+                    return
+                events, self._pending_events = self._pending_events, []
+            self._send_events(events)
+            time.sleep(EMIT_BATCH_WINDOW)
+    
+    def _send_events(self, events: List[Dict[str, Any]]):
+        # One timestamp per batch; its events are at most EMIT_BATCH_WINDOW apart
+        timestamp = datetime.now().isoformat()
+        for event in events:
+            event["timestamp"] = timestamp
         try:
-            self.socketio.emit("event", event)
-            self.socketio.emit("agents_update", {
-                "agents": [c.to_dict() for c in self.fleet_server.clients.get_all()],
+            # One emit per room: the packet is encoded once for all dashboards
+            if len(events) == 1:
+                self.socketio.emit("event", events[0], to="dashboard")
+            else:
+                self.socketio.emit("events", events, to="dashboard")
+            update = {
+                "agents": self.fleet_server.clients.to_dicts(),
                 "stats": self.fleet_server.clients.stats(),
-            })
+            }
+            if self._msgpack_updates:
+                self.socketio.emit("agents_update_mp", msgpack.packb(update, use_bin_type=True), to="dashboard")
+            else:
+                self.socketio.emit("agents_update", update, to="dashboard")
         except Exception as e:
-            logger.debug(f"WebSocket emit error: {e}")
+            logger.debug("WebSocket emit error: %s", e)
     
     def start(self) -> "DashboardServer":
         """Start the dashboard server in a background thread."""
@@ -328,11 +526,17 @@ class DashboardServer:
         
         self._thread = threading.Thread(target=run, daemon=True)
         self._thread.start()
+        self.db.start_purge()
         self._running = True
-        logger.info(f"Dashboard started on http://{self.host}:{self.port}")
+        logger.info("Dashboard started on http://%s:%s", self.host, self.port)
         return self
     
     def stop(self):
         """Stop the dashboard server."""
+        self.db.stop_purge()
+        with self._events_ready:
+            self._emit_thread = None
+            self._pending_events = []
+            self._events_ready.notify_all()
         self._running = False
         logger.info("Dashboard stopped")
@@ -48,23 +48,37 @@ function initWebSocket() {
 
     socket.on('connect', () => {
         console.log('WebSocket connected');
+        // Join the room live updates are sent to (re-sent after reconnects)
+        socket.emit('subscribe_dashboard');
     });
 
-    socket.on('agents_update', (data) => {
-        agents = data.agents || [];
-        updateStats(data.stats);
-        renderAgentsTable();
+    socket.on('agents_update', applyAgentsUpdate);
+
+    // Binary variant, sent when the server runs with msgpack_updates
+    socket.on('agents_update_mp', (buffer) => {
+        applyAgentsUpdate(MessagePack.decode(new Uint8Array(buffer)));
     });
 
     socket.on('event', (event) => {
         addActivityItem(event);
     });
 
+    // Events coalesced by the server during a burst
+    socket.on('events', (events) => {
+        events.forEach(event => addActivityItem(event));
+    });
+
     socket.on('disconnect', () => {
         console.log('WebSocket disconnected');
     });
 }
 
+function applyAgentsUpdate(data) {
+    agents = data.agents || [];
+    updateStats(data.stats);
+    renderAgentsTable();
+}
+
 // Fetch agents from API
 async function fetchAgents() {
     try {
@@ -0,0 +1,79 @@
+/**
+ * PyFleet Dashboard - MessagePack decoder for agents_update_mp
+ *
+ * Only loaded when the server runs with msgpack_updates. Decodes what
+ * msgpack.packb() produces for the update dict; ext types are rejected.
+ */
+
+const MessagePack = (() => {
+    const textDecoder = new TextDecoder();
+
+    function decode(bytes) {
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        let pos = 0;
+
+        const str = (n) => {
+            const s = textDecoder.decode(bytes.subarray(pos, pos + n));
+            pos += n;
+            return s;
+        };
+        const bin = (n) => {
+            const b = bytes.slice(pos, pos + n);
+            pos += n;
+            return b;
+        };
+        const array = (n) => {
+            const out = new Array(n);
+            for (let i = 0; i < n; i++) out[i] = read();
+            return out;
+        };
+        const map = (n) => {
+            const out = {};
+            for (let i = 0; i < n; i++) {
+                const key = read();
+                out[key] = read();
+            }
+            return out;
+        };
+
+        function read() {
+            const t = view.getUint8(pos++);
+            let v;
+            if (t <= 0x7f) return t;
+            if (t >= 0xe0) return t - 0x100;
+            if (t >= 0xa0 && t <= 0xbf) return str(t & 0x1f);
+            if (t >= 0x90 && t <= 0x9f) return array(t & 0x0f);
+            if (t >= 0x80 && t <= 0x8f) return map(t & 0x0f);
+            switch (t) {
+                case 0xc0: return null;
+                case 0xc2: return false;
+                case 0xc3: return true;
+                case 0xc4: v = view.getUint8(pos); pos += 1; return bin(v);
+                case 0xc5: v = view.getUint16(pos); pos += 2; return bin(v);
+                case 0xc6: v = view.getUint32(pos); pos += 4; return bin(v);
+                case 0xca: v = view.getFloat32(pos); pos += 4; return v;
+                case 0xcb: v = view.getFloat64(pos); pos += 8; return v;
+                case 0xcc: v = view.getUint8(pos); pos += 1; return v;
+                case 0xcd: v = view.getUint16(pos); pos += 2; return v;
+                case 0xce: v = view.getUint32(pos); pos += 4; return v;
+                case 0xcf: v = Number(view.getBigUint64(pos)); pos += 8; return v;
+                case 0xd0: v = view.getInt8(pos); pos += 1; return v;
+                case 0xd1: v = view.getInt16(pos); pos += 2; return v;
+                case 0xd2: v = view.getInt32(pos); pos += 4; return v;
+                case 0xd3: v = Number(view.getBigInt64(pos)); pos += 8; return v;
+                case 0xd9: v = view.getUint8(pos); pos += 1; return str(v);
+                case 0xda: v = view.getUint16(pos); pos += 2; return str(v);
+                case 0xdb: v = view.getUint32(pos); pos += 4; return str(v);
+                case 0xdc: v = view.getUint16(pos); pos += 2; return array(v);
+                case 0xdd: v = view.getUint32(pos); pos += 4; return array(v);
+                case 0xde: v = view.getUint16(pos); pos += 2; return map(v);
+                case 0xdf: v = view.getUint32(pos); pos += 4; return map(v);
+                default: throw new Error(`Unsupported MessagePack type 0x${t.toString(16)}`);
+            }
+        }
+
+        return read();
+    }
+
+    return { decode };
+})();
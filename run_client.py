@@ -10,6 +10,11 @@ import json
 import urllib.request
 import urllib.error
 
+try:
+    import socketio
+except ImportError:
+    socketio = None
+
 # Add paths for imports
 _here = os.path.dirname(os.path.abspath(__file__))
 _root = os.path.abspath(os.path.join(_here, "..", "..", ".."))
@@ -33,26 +38,61 @@ logging.basicConfig(
 
 # Broadcast polling helper
 _seen_broadcasts = set()
+_last_etag = None
+
+def show_broadcast(b: dict):
+    """Print a broadcast the first time it is seen."""
+    bid = b.get('id', '')
+    if bid in _seen_broadcasts:
+        return
+    
+    _seen_broadcasts.add(bid)
+    msg_type = b.get('message_type', '?')
+    data = b.get('data', '')
+    print(f"\n  [!] BROADCAST RECEIVED: {msg_type}")
+    if data:
+        print(f"      Data: {data[:100]}")
+
+
+def subscribe_broadcasts(client_id: str, tags: list, dashboard_url: str):
+    """Have the dashboard push broadcasts over Socket.IO. Returns None if polling is needed instead."""
+    if socketio is None:
+        return None
+    
+    sio = socketio.Client()
+    
+    @sio.event
+    def connect():
+        # Also re-sent after automatic reconnects
+        sio.emit('subscribe_broadcasts', {'client_id': client_id, 'tags': tags})
+    
+    sio.on('broadcast', show_broadcast)
+    try:
+        sio.connect(dashboard_url)
+    except Exception as e:
+        logging.debug(f"Broadcast subscribe error: {e}")
+        return None
+    # Pick up broadcasts created before we subscribed
+    poll_broadcasts(client_id, dashboard_url)
+    return sio
+
 
 def poll_broadcasts(client_id: str, dashboard_url: str):
     """Poll dashboard for pending broadcasts."""
-    global _seen_broadcasts
+    global _seen_broadcasts, _last_etag
     try:
         url = f"{dashboard_url}/api/broadcasts/pending/{client_id}"
-        with urllib.request.urlopen(url, timeout=5) as resp:
+        # Server answers 304 when nothing changed since the last poll
+        headers = {'If-None-Match': _last_etag} if _last_etag else {}
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=5) as resp:
             broadcasts = json.loads(resp.read().decode())
+            _last_etag = resp.headers.get('ETag')
         
         for b in broadcasts:
-            bid = b.get('id', '')
-            if bid in _seen_broadcasts:
-                continue
-            
-            _seen_broadcasts.add(bid)
-            msg_type = b.get('message_type', '?')
-            data = b.get('data', '')
-            print(f"\n  [!] BROADCAST RECEIVED: {msg_type}")
-            if data:
-                print(f"      Data: {data[:100]}")
+            show_broadcast(b)
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            logging.debug(f"Broadcast poll error: {e}")
     except urllib.error.URLError:
         pass
     except Exception as e:
@@ -80,6 +120,7 @@ def main(argv):
         agent_version="1.0.0",
         tags=[f"agent-{name}"],
     )
+    sio = None
     
     try:
         client.start()
@@ -87,13 +128,17 @@ def main(argv):
         print(f"  Dashboard: {dashboard_url}")
         print("  Press Ctrl+C to stop\n")
         
+        # Pushed broadcasts when python-socketio is installed, else polled below
+        sio = subscribe_broadcasts(client.client_id, client.tags, dashboard_url)
+        
         count = 0
         while True:
             time.sleep(random.uniform(5, 10))
             count += 1
             
             # Poll for broadcasts
-            poll_broadcasts(client.client_id, dashboard_url)
+            if sio is None:
+                poll_broadcasts(client.client_id, dashboard_url)
             
             data = {
                 "cpu": random.uniform(10, 90),
@@ -106,6 +151,8 @@ def main(argv):
     except KeyboardInterrupt:
         print("\n  Stopping...")
     finally:
+        if sio is not None:
+            sio.disconnect()
         client.stop()
         print(f"  Stats: {client.stats()}")
 
@@ -5,11 +5,55 @@ Broadcast Manager - In-memory broadcast storage and management.
 import os
 import threading
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
 
 from pyfleet.common import Address, Label
 from pyfleet.common.broadcast import Broadcast
 
+# Distinct client label sets whose masks/matches are remembered before starting over
+LABEL_SET_CACHE_SIZE = 4096
+
+# Random bytes fetched per os.urandom() call when minting broadcast IDs (256 IDs' worth)
+ID_POOL_SIZE = 4096
+ID_SIZE = 16
+
+
+class LabelInterner:
+    """
+    Assigns each required (service_name, label) pair its own bit, so label
+    sets can be compared as integer masks instead of Python sets.
+    
+    The bits are fixed at construction. Pairs outside them get no bit: no
+    broadcast requires them, so they can't affect a match. BroadcastManager
+    builds a new interner on every publish, so bits of labels whose last
+    broadcast went away are reclaimed.
+    """
+    
+    def __init__(self, required: Iterable[Tuple[str, str]] = ()):
+        self._bits: Dict[Tuple[str, str], int] = {
+            pair: 1 << i for i, pair in enumerate(dict.fromkeys(required))
+        }
+        # label set -> mask; fleets share a handful of label sets, so most lookups hit
+        self._set_masks: Dict[FrozenSet[Tuple[str, str]], int] = {}
+    
+    def mask(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        """Get the bitmask for a set of label pairs."""
+        mask = 0
+        bits = self._bits
+        for pair in pairs:
+            mask |= bits.get(pair, 0)
+        return mask
+    
+    def set_mask(self, pairs: FrozenSet[Tuple[str, str]]) -> int:
+        """Get the bitmask for a frozen label set, remembering the result."""
+        mask = self._set_masks.get(pairs)
+        if mask is None:
+            mask = self.mask(pairs)
+            if len(self._set_masks) >= LABEL_SET_CACHE_SIZE:
+                self._set_masks.clear()
+            self._set_masks[pairs] = mask
+        return mask
+
 
 class BroadcastManager:
     """
@@ -21,6 +65,38 @@ class BroadcastManager:
     def __init__(self):
         self._broadcasts: Dict[str, Broadcast] = {}
         self._lock = threading.RLock()
+        # Immutable (broadcast, required-label mask, expiration_time) entries for
+        # _broadcasts' values, republished on every change so the read paths never take _lock
+        self._snapshot: Tuple[Tuple[Broadcast, int, Optional[datetime]], ...] = ()
+        # (interner the snapshot's masks come from, snapshot, client label mask -> entries
+        # it matches), replaced as one tuple by _publish so readers see a consistent set
+        self._matching: Tuple[LabelInterner, tuple, Dict[int, tuple]] = (LabelInterner(), (), {})
+        # Pre-fetched random bytes that broadcast IDs are sliced from
+        self._id_pool = b""
+        self._id_pos = 0
+        self._id_lock = threading.Lock()
+    
+    def _publish(self) -> None:
+        # Caller holds _lock
+        broadcasts = self._broadcasts.values()
+        # Pick up required_labels edited since the broadcast was last published
+        for b in broadcasts:
+            b.invalidate()
+        labels = LabelInterner(pair for b in broadcasts for pair in b.required_set)
+        snapshot = tuple(
+            (b, labels.mask(b.required_set), b.expiration_time) for b in broadcasts
+        )
+        self._snapshot = snapshot
+        self._matching = (labels, snapshot, {})
+    
+    def _next_id(self) -> bytes:
+        with self._id_lock:
+            pos = self._id_pos
+            if pos + ID_SIZE > len(self._id_pool):
+                self._id_pool = os.urandom(ID_POOL_SIZE)
+                pos = 0
+            self._id_pos = pos + ID_SIZE
+            return self._id_pool[pos:pos + ID_SIZE]
     
     def create(
         self,
@@ -31,7 +107,7 @@ class BroadcastManager:
         source_service: str = "pyfleet",
     ) -> Broadcast:
         """Create a new broadcast."""
-        broadcast_id = os.urandom(16)
+        broadcast_id = self._next_id()
         
         broadcast = Broadcast(
             broadcast_id=broadcast_id,
@@ -44,6 +120,7 @@ class BroadcastManager:
         
         with self._lock:
             self._broadcasts[broadcast_id.hex()] = broadcast
+            self._publish()
         
         return broadcast
     
@@ -54,37 +131,57 @@ class BroadcastManager:
     
     def get_active(self) -> List[Broadcast]:
         """Get all active (non-expired) broadcasts."""
+        # One clock read per call rather than one per broadcast via is_expired()
+        now = datetime.now()
+        return [b for b, _, expires in self._snapshot if expires is None or expires >= now]
+    
+    def sweep_expired(self) -> int:
+        """Drop expired broadcasts. Returns how many were removed."""
         with self._lock:
-            active = []
-            expired_ids = []
-            
-            for bid, broadcast in self._broadcasts.items():
-                if broadcast.is_expired():
-                    expired_ids.append(bid)
-                else:
-                    active.append(broadcast)
-            
-            # Clean up expired
+            expired_ids = [bid for bid, b in self._broadcasts.items() if b.is_expired()]
             for bid in expired_ids:
                 del self._broadcasts[bid]
-            
-            return active
+            if expired_ids:
+                self._publish()
+            return len(expired_ids)
     
     def delete(self, broadcast_id: str) -> bool:
         """Delete a broadcast."""
         with self._lock:
             if broadcast_id in self._broadcasts:
                 del self._broadcasts[broadcast_id]
+                self._publish()
                 return True
             return False
     
     def get_for_client(self, client_labels: List[Label]) -> List[Broadcast]:
         """Get broadcasts matching a client's labels."""
-        matching = []
-        for broadcast in self.get_active():
-            if broadcast.matches_labels(client_labels):
-                matching.append(broadcast)
-        return matching
+        labels, snapshot, cache = self._matching
+        have = labels.set_mask(frozenset((l.service_name, l.label) for l in client_labels))
+        matched = cache.get(have)
+        if matched is None:
+            matched = tuple(
+                (b, expires) for b, required, expires in snapshot
+                if have & required == required
+            )
+            if len(cache) >= LABEL_SET_CACHE_SIZE:
+                cache.clear()
+            cache[have] = matched
+        now = datetime.now()
+        # Expired entries linger in the snapshot until the next sweep_expired()
+        return [b for b, expires in matched if expires is None or expires >= now]
+    
+    def match_clients(self, broadcast: Broadcast, clients: Dict[str, List[Label]]) -> List[str]:
+        """Get IDs of the clients a broadcast should fan out to."""
+        # Bits for just this broadcast's labels, so it needn't be published here
+        set_mask = LabelInterner(broadcast.required_set).set_mask
+        required = set_mask(broadcast.required_set)
+        if not required:
+            return list(clients)
+        return [
+            client_id for client_id, labels in clients.items()
+            if set_mask(frozenset((l.service_name, l.label) for l in labels)) & required == required
+        ]
     
     def stats(self) -> Dict[str, int]:
         """Get broadcast statistics."""
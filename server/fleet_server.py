@@ -2,17 +2,19 @@
 FleetServer - Multi-client management server.
 """
 
-import json
 import logging
+import os
 import threading
 import hashlib
 from concurrent import futures
 from datetime import datetime
-from typing import Callable, Dict, List, Optional
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
 
 import grpc
 
-from pyfleet.common import ClientInfo, ClientStatus, Command
+from pyfleet.common import ClientInfo, ClientStatus, Command, json_loads
+from pyfleet.server.broadcast_manager import BroadcastManager
 from pyfleet.server.registry import ClientRegistry
 
 # Import from fleetspeak package (protobuf definitions)
@@ -21,6 +23,39 @@ from fleetspeak.src.server.grpcservice.proto.fleetspeak_grpcservice import grpcs
 
 logger = logging.getLogger(__name__)
 
+# Accept the client's keepalive pings (see client CHANNEL_OPTIONS) and
+# larger payloads than gRPC's 4 MB default.
+SERVER_OPTIONS = [
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_ping_interval_without_data_ms", 20000),
+    ("grpc.max_send_message_length", 64 * 1024 * 1024),
+    ("grpc.max_receive_message_length", 64 * 1024 * 1024),
+]
+
+
+def default_workers() -> int:
+    """gRPC handler threads: $PYFLEET_GRPC_WORKERS, else twice the CPU count (at least 16).
+    
+    Process() mostly waits in gRPC's C core, which releases the GIL, so the pool
+    should exceed the core count for handlers to overlap.
+    """
+    env = os.environ.get("PYFLEET_GRPC_WORKERS")
+    if env:
+        return int(env)
+    return max(16, (os.cpu_count() or 4) * 2)
+
+
+@lru_cache(maxsize=4096)
+def _peer_client_id(peer: str) -> str:
+    """Stable client ID for a peer that didn't send one (hashed once per peer)."""
+    return hashlib.sha256(peer.encode()).hexdigest()[:16]
+
+
+@lru_cache(maxsize=4096)
+def _hex_client_id(raw: bytes) -> str:
+    """Hex client ID for raw source bytes (one shared str per client, so its hash stays cached)."""
+    return raw.hex()
+
 
 class _Servicer(grpcservice_pb2_grpc.ProcessorServicer):
     """Internal gRPC servicer."""
@@ -28,35 +63,46 @@ class _Servicer(grpcservice_pb2_grpc.ProcessorServicer):
     def __init__(self, server: "FleetServer"):
         super().__init__()
         self._server = server
+        # message_type -> handler(client_id, request, context); anything else is a regular message
+        self._dispatch_table = {
+            "enrollment": self._handle_enrollment,
+            "heartbeat": self._handle_heartbeat,
+            "batch": self._handle_batch,
+        }
     
     def Process(self, request: common_pb2.Message, context: grpc.ServicerContext):
-        try:
-            # Get client ID
-            client_id = request.source.client_id.hex() if request.source.client_id else None
-            if not client_id:
-                peer = context.peer()
-                client_id = hashlib.sha256(peer.encode()).hexdigest()[:16] if peer else "unknown"
-            
-            # Handle message types
-            if request.message_type == "enrollment":
-                self._handle_enrollment(client_id, request, context)
-            elif request.message_type == "heartbeat":
-                self._server.clients.heartbeat(client_id)
-            else:
-                self._server.clients.heartbeat(client_id)
-                client = self._server.clients.get(client_id)
-                if client:
-                    client.message_count += 1
-                self._server._dispatch(request, context, client)
+        # Get client ID (attribute reads and the cached hash can't raise)
+        raw_id = request.source.client_id
+        if raw_id:
+            client_id = _hex_client_id(raw_id)
+        else:
+            peer = context.peer()
+            client_id = _peer_client_id(peer) if peer else "unknown"
         
-        except Exception as e:
-            logger.exception(f"Error: {e}")
+        handler = self._dispatch_table.get(request.message_type, self._handle_message)
+        try:
+            handler(client_id, request, context)
+        except Exception:
+            logger.exception("Error processing message")
         
         return common_pb2.EmptyMessage()
     
+    def _handle_heartbeat(self, client_id: str, request, context):
+        self._server.clients.heartbeat(client_id)
+    
+    def _handle_batch(self, client_id: str, request, context):
+        # Buffered client sends, packed as ContactData.messages
+        batch = common_pb2.ContactData.FromString(request.data.value)
+        for msg in batch.messages:
+            self._handle_message(client_id, msg, context)
+    
+    def _handle_message(self, client_id: str, request, context):
+        client = self._server.clients.record_message(client_id)
+        self._server._dispatch(request, context, client)
+    
     def _handle_enrollment(self, client_id: str, request, context):
         try:
-            data = json.loads(request.data.value.decode()) if request.data.value else {}
+            data = json_loads(request.data.value) if request.data.value else {}
             # Prefer client-reported IP, fallback to peer IP
             peer = context.peer() or ""
             peer_ip = peer.split(":")[-2] if ":" in peer else ""
@@ -70,9 +116,9 @@ class _Servicer(grpcservice_pb2_grpc.ProcessorServicer):
                 agent_version=data.get("agent_version", ""),
                 ip_address=ip,
             )
-            logger.info(f"Enrolled: {client_id}")
-        except Exception as e:
-            logger.exception(f"Enrollment error: {e}")
+            logger.info("Enrolled: %s", client_id)
+        except Exception:
+            logger.exception("Enrollment error")
 
 
 class FleetServer:
@@ -97,24 +143,37 @@ class FleetServer:
         self,
         listen_address: str = "0.0.0.0:9999",
         service_name: str = "pyfleet",
-        workers: int = 10,
+        workers: Optional[int] = None,   # Defaults to default_workers()
         heartbeat_timeout: float = 30.0,  # Degraded after 30s
         offline_timeout: float = 90.0,    # Offline after 90s
     ):
         self.listen_address = listen_address
         self.service_name = service_name
-        self._workers = workers
+        self._workers = workers or default_workers()
+        cpus = os.cpu_count() or 1
+        if self._workers < cpus:
+            logger.warning("%d gRPC workers on %d CPUs; handlers will queue behind each other", self._workers, cpus)
         
         self.clients = ClientRegistry(
             heartbeat_timeout=heartbeat_timeout,
             offline_timeout=offline_timeout,
         )
+        self.broadcasts = BroadcastManager()
         
-        self._handlers: List[Callable] = []
+        # Replaced, never mutated, so _dispatch can iterate it without a lock
+        self._handlers: Tuple[Callable, ...] = ()
         self._grpc_server: Optional[grpc.Server] = None
         self._running = False
         self._monitor_thread: Optional[threading.Thread] = None
         self._stop = threading.Event()
+        self._dashboard = None
+    
+    def attach_dashboard(self, dashboard) -> None:
+        """Record the dashboard serving this server; only one may attach."""
+        # A second dashboard would register every hook again, doubling DB writes and emits
+        if self._dashboard is not None:
+            raise RuntimeError("A dashboard is already attached to this FleetServer")
+        self._dashboard = dashboard
     
     def on_enroll(self, handler: Callable) -> Callable:
         """Decorator for enrollment events."""
@@ -128,15 +187,15 @@ class FleetServer:
     
     def on_message(self, handler: Callable) -> Callable:
         """Decorator for message events."""
-        self._handlers.append(handler)
+        self._handlers = self._handlers + (handler,)
         return handler
     
     def _dispatch(self, message, context, client):
         for h in self._handlers:
             try:
                 h(message, context, client)
-            except Exception as e:
-                logger.exception(f"Handler error: {e}")
+            except Exception:
+                logger.exception("Handler error")
     
     def start(self) -> "FleetServer":
         """Start the server."""
@@ -144,7 +203,8 @@ class FleetServer:
             raise RuntimeError("Already running")
         
         self._grpc_server = grpc.server(
-            futures.ThreadPoolExecutor(max_workers=self._workers)
+            futures.ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="pyfleet-grpc"),
+            options=SERVER_OPTIONS,
         )
         grpcservice_pb2_grpc.add_ProcessorServicer_to_server(
             _Servicer(self), self._grpc_server
@@ -157,7 +217,7 @@ class FleetServer:
         self._monitor_thread.start()
         
         self._running = True
-        logger.info(f"Server started on {self.listen_address}")
+        logger.info("Server started on %s", self.listen_address)
         return self
     
     def stop(self) -> None:
@@ -174,6 +234,7 @@ class FleetServer:
         while not self._stop.wait(timeout=10):  # Check every 10s
             try:
                 self.clients.check_timeouts()
+                self.broadcasts.sweep_expired()
             except Exception:
                 pass
     
@@ -185,7 +246,7 @@ class FleetServer:
             payload=payload,
             target_id=client_id,
         )
-        logger.debug(f"Command {cmd.command_id} queued for {client_id}")
+        logger.debug("Command %s queued for %s", cmd.command_id, client_id)
         return cmd.command_id
     
     def broadcast(self, command_type: str, payload: bytes = b"", tags: Optional[List[str]] = None) -> Dict[str, str]:
@@ -193,10 +254,7 @@ class FleetServer:
         results = {}
         
         if tags:
-            clients = []
-            for tag in tags:
-                clients.extend(self.clients.get_by_tag(tag))
-            clients = list({c.client_id: c for c in clients}.values())
+            clients = self.clients.get_by_tags(tags)
         else:
             clients = self.clients.get_by_status(ClientStatus.ONLINE)
         
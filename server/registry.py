@@ -3,10 +3,25 @@ Client Registry - tracks all connected clients.
 """
 
 import threading
+import time
 from datetime import datetime
-from typing import Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
-from pyfleet.common import ClientInfo, ClientStatus
+from pyfleet.common import ClientInfo, ClientStatus, json_dumps
+
+
+def _make_chain(callbacks: Iterable[Callable]) -> Callable:
+    """Build one function that calls each callback in turn, ignoring their errors."""
+    callbacks = tuple(callbacks)
+    
+    def chain(*args) -> None:
+        for cb in callbacks:
+            try:
+                cb(*args)
+            except Exception:
+                pass
+    
+    return chain
 
 
 class ClientRegistry:
@@ -18,24 +33,71 @@ class ClientRegistry:
         offline_timeout: float = 300.0,
     ):
         self._clients: Dict[str, ClientInfo] = {}
-        self._lock = threading.RLock()
+        # Writers only; readers use the snapshot below or single dict lookups.
+        # Callbacks run after it is released, so they may call back into the registry.
+        self._lock = threading.Lock()
+        # Immutable copy of _clients' values, republished when clients are added or removed
+        self._values: Tuple[ClientInfo, ...] = ()
         self._heartbeat_timeout = heartbeat_timeout
         self._offline_timeout = offline_timeout
         
         self._on_enroll: List[Callable] = []
         self._on_status_change: List[Callable] = []
+        # Rebuilt by on_enroll()/on_status_change(); triggers call these directly
+        self._enroll_chain = _make_chain(())
+        self._status_chain = _make_chain(())
+        
+        # to_dicts() result, dropped whenever any client changes
+        self._snapshot: Optional[List[Dict[str, Any]]] = None
+        # client_id -> JSON of that client's to_dict(), dropped when the client changes
+        self._json: Dict[str, bytes] = {}
+        # tag -> ids of clients carrying it
+        self._tag_index: Dict[str, Set[str]] = {}
+        # status -> ids of clients currently in it; change status only via _set_status()
+        self._by_status: Dict[ClientStatus, Set[str]] = {s: set() for s in ClientStatus}
+    
+    def _changed(self, client_id: str) -> None:
+        # Caller holds _lock
+        self._snapshot = None
+        self._json.pop(client_id, None)
+    
+    def _set_status(self, client: ClientInfo, status: ClientStatus) -> None:
+        # Caller holds _lock
+        self._by_status[client.status].discard(client.client_id)
+        client.status = status
+        self._by_status[status].add(client.client_id)
+    
+    def _reindex_tags(self, client_id: str, old: Iterable[str], new: Iterable[str]) -> None:
+        # Caller holds _lock
+        old, new = set(old), set(new)
+        for tag in old - new:
+            ids = self._tag_index.get(tag)
+            if ids is not None:
+                ids.discard(client_id)
+                if not ids:
+                    del self._tag_index[tag]
+        for tag in new - old:
+            self._tag_index.setdefault(tag, set()).add(client_id)
     
     def register(self, client_id: str, **kwargs) -> ClientInfo:
         """Register or update a client."""
+        enrolled = False
+        now = datetime.now()
         with self._lock:
-            now = datetime.now()
-            
             if client_id in self._clients:
                 client = self._clients[client_id]
+                old_tags = set(client.tags)
+                old_status = client.status
                 for key, value in kwargs.items():
                     if hasattr(client, key):
                         setattr(client, key, value)
+                self._reindex_tags(client_id, old_tags, client.tags)
+                if client.status != old_status:
+                    self._by_status[old_status].discard(client_id)
+                    self._by_status[client.status].add(client_id)
+                client.invalidate()
                 client.last_seen = now
+                self._changed(client_id)
             else:
                 client = ClientInfo(
                     client_id=client_id,
@@ -45,51 +107,109 @@ class ClientRegistry:
                     **kwargs
                 )
                 self._clients[client_id] = client
-                self._trigger_enroll(client)
-            
-            return client
+                self._values = tuple(self._clients.values())
+                self._by_status[client.status].add(client_id)
+                self._reindex_tags(client_id, (), client.tags)
+                self._changed(client_id)
+                enrolled = True
+        
+        if enrolled:
+            self._trigger_enroll(client)
+        return client
     
-    def heartbeat(self, client_id: str) -> Optional[ClientInfo]:
-        """Update client heartbeat."""
+    def heartbeat(self, client_id: str, message: bool = False) -> Optional[ClientInfo]:
+        """Update client heartbeat; message=True also counts a message from it."""
+        # Clock reads stay outside the lock to keep the critical section short
+        mono = time.monotonic()
+        now = datetime.now()
         with self._lock:
-            if client_id in self._clients:
-                client = self._clients[client_id]
-                old_status = client.status
-                client.last_heartbeat = datetime.now()
-                client.last_seen = client.last_heartbeat
-                
-                if client.status != ClientStatus.ONLINE:
-                    client.status = ClientStatus.ONLINE
-                    self._trigger_status_change(client, old_status, ClientStatus.ONLINE)
-                
-                return client
-        return None
+            client = self._clients.get(client_id)
+            if client is None:
+                return None
+            old_status = client.status
+            client.last_heartbeat_mono = mono
+            client.last_heartbeat = now
+            client.last_seen = now
+            if message:
+                client.message_count += 1
+            if old_status != ClientStatus.ONLINE:
+                self._set_status(client, ClientStatus.ONLINE)
+            self._changed(client_id)
+        
+        if old_status != ClientStatus.ONLINE:
+            self._trigger_status_change(client, old_status, ClientStatus.ONLINE)
+        return client
+    
+    def record_message(self, client_id: str) -> Optional[ClientInfo]:
+        """Count a message from a client; also counts as a heartbeat."""
+        return self.heartbeat(client_id, message=True)
     
     def get(self, client_id: str) -> Optional[ClientInfo]:
         """Get client by ID."""
-        with self._lock:
-            return self._clients.get(client_id)
+        return self._clients.get(client_id)
     
     def get_all(self) -> List[ClientInfo]:
         """Get all clients."""
+        return list(self._values)
+    
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """All clients' to_dict(), rebuilt only after a change. The list is shared; don't modify it."""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                snapshot = self._snapshot = [c.to_dict() for c in self._clients.values()]
+            return snapshot
+    
+    def to_json(self) -> bytes:
+        """JSON array of all clients' to_dict(); only clients changed since the last call are re-encoded."""
         with self._lock:
-            return list(self._clients.values())
+            cache = self._json
+            parts = []
+            for client_id, client in self._clients.items():
+                encoded = cache.get(client_id)
+                if encoded is None:
+                    encoded = cache[client_id] = json_dumps(client.to_dict())
+                parts.append(encoded)
+            return b"[" + b",".join(parts) + b"]"
     
     def get_by_status(self, status: ClientStatus) -> List[ClientInfo]:
         """Get clients by status."""
-        with self._lock:
-            return [c for c in self._clients.values() if c.status == status]
+        clients = self._clients
+        # tuple() copies the set in one C call, safe against concurrent writers
+        return [c for c in map(clients.get, tuple(self._by_status[status])) if c is not None]
     
     def get_by_tag(self, tag: str) -> List[ClientInfo]:
         """Get clients with a tag."""
         with self._lock:
-            return [c for c in self._clients.values() if tag in c.tags]
+            return [self._clients[cid] for cid in self._tag_index.get(tag, ())]
+    
+    def get_by_tags(self, tags: Iterable[str]) -> List[ClientInfo]:
+        """Get clients with any of the tags, each client once."""
+        with self._lock:
+            ids = set().union(*(self._tag_index.get(tag, ()) for tag in tags))
+            return [self._clients[cid] for cid in ids]
     
     def add_tag(self, client_id: str, tag: str) -> bool:
         """Add tag to client."""
         with self._lock:
             if client_id in self._clients:
-                self._clients[client_id].tags.add(tag)
+                client = self._clients[client_id]
+                client.tags.add(tag)
+                self._tag_index.setdefault(tag, set()).add(client_id)
+                client.invalidate()
+                self._changed(client_id)
+                return True
+        return False
+    
+    def remove_tag(self, client_id: str, tag: str) -> bool:
+        """Remove tag from client."""
+        with self._lock:
+            client = self._clients.get(client_id)
+            if client is not None and tag in client.tags:
+                client.tags.discard(tag)
+                self._reindex_tags(client_id, (tag,), ())
+                client.invalidate()
+                self._changed(client_id)
                 return True
         return False
     
@@ -97,63 +217,61 @@ class ClientRegistry:
         """Remove a client."""
         with self._lock:
             if client_id in self._clients:
-                del self._clients[client_id]
+                client = self._clients.pop(client_id)
+                self._reindex_tags(client_id, client.tags, ())
+                self._by_status[client.status].discard(client_id)
+                self._values = tuple(self._clients.values())
+                self._changed(client_id)
                 return True
         return False
     
     def check_timeouts(self) -> List[ClientInfo]:
         """Check for timed-out clients."""
-        changed = []
-        now = datetime.now()
+        transitions = []
+        now = time.monotonic()
         
         with self._lock:
             for client in self._clients.values():
-                if client.last_heartbeat is None:
+                last = client.last_heartbeat_mono
+                if last is None:
                     continue
                 
-                elapsed = (now - client.last_heartbeat).total_seconds()
+                elapsed = now - last
                 old_status = client.status
                 
                 if elapsed > self._offline_timeout:
-                    if client.status != ClientStatus.OFFLINE:
-                        client.status = ClientStatus.OFFLINE
-                        changed.append(client)
-                        self._trigger_status_change(client, old_status, ClientStatus.OFFLINE)
+                    new_status = ClientStatus.OFFLINE
                 elif elapsed > self._heartbeat_timeout:
-                    if client.status != ClientStatus.DEGRADED:
-                        client.status = ClientStatus.DEGRADED
-                        changed.append(client)
-                        self._trigger_status_change(client, old_status, ClientStatus.DEGRADED)
+                    new_status = ClientStatus.DEGRADED
+                else:
+                    continue
+                if old_status != new_status:
+                    self._set_status(client, new_status)
+                    self._changed(client.client_id)
+                    transitions.append((client, old_status, new_status))
         
-        return changed
+        for client, old_status, new_status in transitions:
+            self._trigger_status_change(client, old_status, new_status)
+        return [client for client, _, _ in transitions]
     
     def stats(self) -> Dict[str, int]:
         """Get registry stats."""
-        with self._lock:
-            stats = {s.value: 0 for s in ClientStatus}
-            for c in self._clients.values():
-                stats[c.status.value] += 1
-            stats["total"] = len(self._clients)
-            return stats
+        stats = {s.value: len(ids) for s, ids in self._by_status.items()}
+        stats["total"] = len(self._values)
+        return stats
     
     def on_enroll(self, callback: Callable) -> None:
         """Register enrollment callback."""
         self._on_enroll.append(callback)
+        self._enroll_chain = _make_chain(self._on_enroll)
     
     def on_status_change(self, callback: Callable) -> None:
         """Register status change callback."""
         self._on_status_change.append(callback)
+        self._status_chain = _make_chain(self._on_status_change)
     
     def _trigger_enroll(self, client: ClientInfo) -> None:
-        for cb in self._on_enroll:
-            try:
-                cb(client)
-            except Exception:
-                pass
+        self._enroll_chain(client)
     
     def _trigger_status_change(self, client: ClientInfo, old: ClientStatus, new: ClientStatus) -> None:
-        for cb in self._on_status_change:
-            try:
-                cb(client, old, new)
-            except Exception:
-                pass
+        self._status_chain(client, old, new)